@@ -1,20 +1,29 @@
+from time import perf_counter
+BOOT_STARTED = perf_counter()  # начало таймлайна запуска — до тяжёлых импортов
 import sys, os, cv2, random, json
+import numpy as np
 import gc
+import heapq
+import threading
+import queue
+from collections import deque, OrderedDict
 from datetime import datetime, time, timedelta, date
-from PyQt5.QtCore import Qt, QTimer, QRect, QTime, QEvent, QAbstractItemModel, QItemSelectionModel, QSize, QDate, QThread, pyqtSignal, QMimeData
+from PyQt5.QtCore import Qt, QObject, QTimer, QRect, QTime, QEvent, QAbstractItemModel, QAbstractListModel, QModelIndex, QItemSelectionModel, QSize, QDate, QThread, pyqtSignal, QMimeData
 from PyQt5.QtWidgets import (
-    QApplication, QLabel, QWidget, QVBoxLayout, QHBoxLayout,
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QMessageBox, QListWidget, QFileDialog,
     QListWidgetItem, QLineEdit, QLabel as QLabelWidget,
     QInputDialog, QCheckBox, QAbstractItemView, QMenu,
     QComboBox, QStyledItemDelegate, QStyleOptionButton, QStyle,
     QTimeEdit, QDialog, QFormLayout, QDialogButtonBox,
-    QSplitter, QFrame, QTextEdit, QTableWidget, QTableWidgetItem, QDateEdit, QSizePolicy, QToolButton
+    QSplitter, QFrame, QTextEdit, QTableWidget, QTableWidgetItem, QDateEdit, QSizePolicy, QToolButton, QListView
 )
-from PyQt5.QtGui import QPixmap, QImage, QStandardItemModel, QStandardItem, QCursor, QFont, QIcon, QColor
+from PyQt5.QtGui import QImage, QImageReader, QPainter, QStandardItemModel, QStandardItem, QCursor, QFont, QIcon, QColor
 import csv
 from PyQt5 import QtCore
 from functools import partial
+from concurrent.futures import ThreadPoolExecutor, CancelledError, TimeoutError as FutureTimeoutError
+from time import monotonic, perf_counter, thread_time, sleep
 
 print('PyQt5 version:', QtCore.PYQT_VERSION_STR)
 
@@ -23,8 +32,88 @@ SUPPORTED_IMAGE_EXTS = ['.jpg', '.jpeg', '.png', '.bmp', '.webp']
 SUPPORTED_EXTS = SUPPORTED_VIDEO_EXTS + SUPPORTED_IMAGE_EXTS
 
 DAYS_OF_WEEK = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+SCHEDULE_RECHECK_SECONDS = 300  # не дольше этого ждём границу расписания без сверки с часами (NTP, DST)
 
 SETTINGS_FILE = 'settings.json'
+SETTINGS_SAVE_DELAY_MS = 1000  # изменения настроек за это окно записываются одним файлом
+LIBRARY_STORE = 'json'  # 'json' — всё в settings.json, 'sqlite' — библиотека в базе LIBRARY_DB_FILE
+LIBRARY_DB_FILE = 'library.db'
+STARTUP_LOG_FILE = 'startup.log'  # строка таймлайна запуска на каждую загрузку
+STARTUP_UI_FALLBACK_MS = 3000  # если первого кадра нет — достроить интерфейс библиотеки через это время
+PATH_CHECK_WORKERS = 16  # параллельная проверка путей библиотеки (сетевые диски)
+PLAY_LOG_FLUSH_SECONDS = 2.0  # записи лога копятся не дольше этого и пишутся пачкой
+PLAY_LOG_MAX_BYTES = 10 * 1024 * 1024  # при превышении лог уходит в архив .gz
+PLAY_LOG_ROTATE_DAILY = True  # новый файл лога на каждый день
+PLAY_LOG_KEEP_ARCHIVES = 30
+
+FRAME_BUFFER_SIZE = 8  # сколько кадров декодер готовит заранее
+PIPELINE_CONVERT_IN_THREAD = True  # масштабирование и BGR->RGB в потоке видео, GUI только выводит
+SCALE_STRETCH = 'stretch'
+SCALE_LETTERBOX = 'letterbox'
+SCALE_MODE = SCALE_STRETCH  # растянуть на всё окно или вписать с чёрными полями
+FRAME_POOL_SIZE = 4  # кадров вывода в пуле: почтовый ящик, экран, конвертация и запас
+IMAGE_CACHE_BYTES = 256 * 1024 * 1024  # бюджет кэша готовых к выводу изображений
+IMAGE_PREFETCH_AHEAD = 3  # сколько следующих изображений плейлиста готовить заранее
+IMAGE_PREFETCH_WORKERS = 2
+IMAGE_PREFETCH_WAIT_SECONDS = 0.5  # дольше не ждём фоновый декод в GUI-потоке, грузим сами
+DECODE_STALL_TIMEOUT = 10.0  # сек без кадров от декодера — ролик считается зависшим
+DECODER_REAP_TIMEOUT = 10.0  # сколько ждать завершения остановленного декодера
+VIDEO_SHUTDOWN_TIMEOUT_MS = 2000
+MAX_FPS = None  # ограничение частоты кадров плеера по умолчанию (например 24 для слабых машин)
+LOOP_CACHE_ENABLED = False  # держать кадры коротких зацикленных роликов в памяти
+LOOP_CACHE_MAX_SECONDS = 15  # ролики длиннее не кэшируются
+LOOP_CACHE_MAX_CLIP_BYTES = 256 * 1024 * 1024
+LOOP_CACHE_BYTES = 512 * 1024 * 1024  # общий бюджет памяти на все ролики
+LOOP_CACHE_COMPRESS = False  # хранить кадры в JPEG: меньше памяти, но декодирование при повторе
+LOOP_CACHE_JPEG_QUALITY = 90
+DECODER_PROCESS_ENABLED = False  # декодировать видео в отдельных процессах (кадры через общую память)
+DECODER_PROCESS_SLOTS = FRAME_BUFFER_SIZE + 2  # слотов кадров в общей памяти: буфер + конвертация + запись
+LIBRARY_INDEX_BY_INODE = False  # узнавать один файл под разными путями (ссылки, сетевые пути) по inode
+
+def process_age_seconds():
+    # Сколько процесс уже живёт (Linux): учитывает запуск интерпретатора до первой строки модуля
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return None
+
+class StartupTimeline:
+    # Отметки запуска от старта процесса до первого кадра; отчёт пишется
+    # один раз — в консоль и строкой в STARTUP_LOG_FILE
+    def __init__(self, started=BOOT_STARTED):
+        self.started = started
+        age = process_age_seconds()
+        self.preamble = max(0.0, age - (perf_counter() - started)) if age is not None else 0.0
+        self.marks = []
+        self.reported = False
+    def mark(self, name):
+        if not self.reported:
+            self.marks.append((name, self.preamble + perf_counter() - self.started))
+    def report(self, path=STARTUP_LOG_FILE):
+        if self.reported:
+            return
+        self.reported = True
+        line = ' | '.join(f'{name} {t * 1000:.0f} ms' for name, t in [('interpreter', self.preamble)] + self.marks)
+        print(f'[STARTUP] {line}')
+        try:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(f'{datetime.now().isoformat(timespec="seconds")} {line}\n')
+        except OSError as e:
+            print('Ошибка записи таймлайна запуска:', e)
+
+def normalize_path(path):
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+def file_identity(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino) if st.st_ino else None
 
 def is_valid_geometry(val):
     try:
@@ -39,32 +128,64 @@ def is_valid_geometry(val):
     except Exception:
         return False
 
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+def minute_of_week(dt):
+    return dt.weekday() * MINUTES_PER_DAY + dt.hour * 60 + dt.minute
+
+startup_timeline = StartupTimeline()
+startup_timeline.mark('imports')
+
 class GroupSchedule:
+    # Расписание компилируется один раз в недельную карту по минутам
+    # (байт на минуту): проверка активности — одно обращение по индексу,
+    # а ближайшая смена состояния — один поиск в карте.
     def __init__(self, start_time=None, end_time=None, days=None, interval_minutes=None, is_interval_group=False):
         self.start_time = start_time
         self.end_time = end_time
         self.days = days or []
         self.interval_minutes = interval_minutes
         self.is_interval_group = is_interval_group
-    def is_active_now(self):
+        self.compile()
+    def compile(self):
+        # Вызывать после изменения времени или дней. None — активно всегда.
         if not self.start_time or not self.end_time or not self.days:
-            print("[GroupSchedule] is_active_now: Нет времени или дней, возвращаем True")
+            self._week = None
+            return
+        start = self.start_time.hour() * 60 + self.start_time.minute()
+        end = self.end_time.hour() * 60 + self.end_time.minute()
+        week = bytearray(MINUTES_PER_WEEK)
+        for day in set(self.days):
+            base = day * MINUTES_PER_DAY
+            if start <= end:
+                week[base + start:base + end] = b'\x01' * (end - start)
+            else:
+                # Ночное расписание в пределах того же дня: 00:00–end и start–24:00
+                week[base:base + end] = b'\x01' * end
+                week[base + start:base + MINUTES_PER_DAY] = b'\x01' * (MINUTES_PER_DAY - start)
+        self._week = bytes(week)
+    def is_active_at(self, dt):
+        if self._week is None:
             return True
-        now = datetime.now()
-        current_day = now.weekday()
-        if current_day not in self.days:
-            print(f"[GroupSchedule] is_active_now: Сегодня ({DAYS_OF_WEEK[current_day]}) не в списке дней {self.days}")
-            return False
-        start_dt = datetime.combine(now.date(), self.start_time.toPyTime())
-        end_dt = datetime.combine(now.date(), self.end_time.toPyTime())
-        if start_dt <= end_dt:
-            result = start_dt.time() <= now.time() <= end_dt.time()
-            print(f"[GroupSchedule] is_active_now: Проверка {start_dt.time()} <= {now.time()} <= {end_dt.time()}: {result}")
-            return result
-        else:
-            result = now.time() >= start_dt.time() or now.time() <= end_dt.time()
-            print(f"[GroupSchedule] is_active_now: Ночное расписание, {now.time()} >= {start_dt.time()} или <= {end_dt.time()}: {result}")
-            return result
+        return self._week[minute_of_week(dt)] == 1
+    def is_active_now(self):
+        return self.is_active_at(datetime.now())
+    def next_change(self, dt=None):
+        # Время ближайшего переключения активности после dt или None, если его нет
+        if self._week is None:
+            return None
+        dt = dt or datetime.now()
+        m = minute_of_week(dt)
+        flipped = b'\x00' if self._week[m] else b'\x01'
+        pos = self._week.find(flipped, m + 1)
+        if pos < 0:
+            pos = self._week.find(flipped, 0, m)
+            if pos < 0:
+                return None
+            pos += MINUTES_PER_WEEK
+        minute_start = dt.replace(second=0, microsecond=0)
+        return minute_start + timedelta(minutes=pos - m)
 
 class GroupScheduleDialog(QDialog):
     def __init__(self, parent=None, schedule=None):
@@ -122,27 +243,402 @@ class GroupScheduleDialog(QDialog):
             is_interval_group=self.interval_group_checkbox.isChecked()
         )
 
+class DisplayFrame:
+    # Кадр, готовый к выводу: QImage ссылается на память массива data, поэтому держим оба.
+    # Кадры из FrameBufferPool возвращаются в пул через release().
+    __slots__ = ('image', 'data', 'pool', 'generation', 'rect')
+    def __init__(self, image, data, pool=None, generation=0):
+        self.image = image
+        self.data = data
+        self.pool = pool
+        self.generation = generation
+        self.rect = None
+    def size(self):
+        return self.image.width(), self.image.height()
+    def release(self):
+        if self.pool is not None:
+            self.pool.release(self)
+    def detach(self):
+        # Собственная копия кадра, не связанная с пулом
+        data = self.data.copy()
+        return DisplayFrame(wrap_rgb_image(data), data)
+
+def wrap_rgb_image(rgb):
+    return QImage(rgb.data, rgb.shape[1], rgb.shape[0], rgb.strides[0], QImage.Format_RGB888)
+
+def release_frame(frame):
+    if isinstance(frame, DisplayFrame):
+        frame.release()
+
+def fit_rect(src_w, src_h, dst_w, dst_h, mode=SCALE_STRETCH):
+    # Прямоугольник (x, y, w, h) внутри окна, куда выводится кадр
+    if mode != SCALE_LETTERBOX or src_w <= 0 or src_h <= 0:
+        return 0, 0, dst_w, dst_h
+    scale = min(dst_w / src_w, dst_h / src_h)
+    fw = max(1, min(dst_w, round(src_w * scale)))
+    fh = max(1, min(dst_h, round(src_h * scale)))
+    return (dst_w - fw) // 2, (dst_h - fh) // 2, fw, fh
+
+def prepare_display_frame(frame, target_w, target_h, mode=SCALE_STRETCH):
+    h, w = frame.shape[:2]
+    _, _, target_w, target_h = fit_rect(w, h, target_w, target_h, mode)
+    if w != target_w or h != target_h:
+        interpolation = cv2.INTER_AREA if w > target_w or h > target_h else cv2.INTER_LINEAR
+        frame = cv2.resize(frame, (target_w, target_h), interpolation=interpolation)
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return DisplayFrame(wrap_rgb_image(rgb), rgb)
+
+class FrameBufferPool:
+    # Заранее выделенные буферы вывода под текущий размер окна. QImage
+    # создаётся один раз на буфер и смотрит в его память без копирования;
+    # resize() пересоздаёт пул только при смене размера окна.
+    def __init__(self, w, h, count=FRAME_POOL_SIZE, mode=SCALE_STRETCH):
+        self._lock = threading.Lock()
+        self._free = []
+        self._scratch = {}
+        self.w = w
+        self.h = h
+        self.mode = mode
+        self.generation = 0
+        self.allocations = 0
+        for _ in range(count):
+            self._free.append(self._allocate(w, h, 0))
+    def _allocate(self, w, h, generation):
+        data = np.empty((h, w, 3), np.uint8)
+        self.allocations += 1
+        return DisplayFrame(wrap_rgb_image(data), data, self, generation)
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            w, h, generation = self.w, self.h, self.generation
+        return self._allocate(w, h, generation)
+    def release(self, frame):
+        with self._lock:
+            if frame.generation == self.generation and len(self._free) < FRAME_POOL_SIZE:
+                self._free.append(frame)
+    def resize(self, w, h, mode=None):
+        with self._lock:
+            mode = mode or self.mode
+            if (w, h, mode) == (self.w, self.h, self.mode):
+                return
+            self.w = w
+            self.h = h
+            self.mode = mode
+            self.generation += 1
+            self._free = []
+    def _scratch_buffer(self, name, h, w):
+        buf = self._scratch.get(name)
+        if buf is None or buf.shape[:2] != (h, w):
+            buf = self._scratch[name] = np.empty((h, w, 3), np.uint8)
+            self.allocations += 1
+        return buf
+    def convert(self, frame):
+        # BGR-кадр декодера -> RGB в буфере пула нужного размера.
+        # В режиме letterbox кадр вписывается в центр, поля чёрные.
+        out = self.acquire()
+        th, tw = out.data.shape[:2]
+        h, w = frame.shape[:2]
+        rect = fit_rect(w, h, tw, th, self.mode)
+        x, y, fw, fh = rect
+        src = frame
+        if w != fw or h != fh:
+            src = self._scratch_buffer('resize', fh, fw)
+            interpolation = cv2.INTER_AREA if w > fw or h > fh else cv2.INTER_LINEAR
+            cv2.resize(frame, (fw, fh), dst=src, interpolation=interpolation)
+        if (fw, fh) == (tw, th):
+            cv2.cvtColor(src, cv2.COLOR_BGR2RGB, dst=out.data)
+        else:
+            if out.rect != rect:
+                out.data.fill(0)
+            rgb = self._scratch_buffer('rgb', fh, fw)
+            cv2.cvtColor(src, cv2.COLOR_BGR2RGB, dst=rgb)
+            out.data[y:y + fh, x:x + fw] = rgb
+        out.rect = rect
+        return out
+
+def load_display_image(path, target_w, target_h, mode=SCALE_STRETCH):
+    # Размер читается из заголовка; при большом запасе по разрешению
+    # JPEG декодируется сразу в уменьшенном виде (1/2, 1/4, 1/8)
+    flags = cv2.IMREAD_COLOR
+    src = QImageReader(path).size()
+    if src.isValid() and target_w > 0 and target_h > 0:
+        factor = min(src.width() / target_w, src.height() / target_h)
+        if factor >= 8:
+            flags = cv2.IMREAD_REDUCED_COLOR_8
+        elif factor >= 4:
+            flags = cv2.IMREAD_REDUCED_COLOR_4
+        elif factor >= 2:
+            flags = cv2.IMREAD_REDUCED_COLOR_2
+    img = cv2.imread(path, flags)
+    if img is None:
+        return None
+    return prepare_display_frame(img, target_w, target_h, mode)
+
+class ImageCache:
+    # LRU-кэш изображений, уже приведённых к размеру окна и формату вывода.
+    # Ключ: путь, mtime файла и целевой размер.
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    @staticmethod
+    def make_key(path, w, h, mode=SCALE_STRETCH):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        return (path, mtime, w, h, mode)
+    def contains(self, key):
+        with self._lock:
+            return key in self._entries
+    def get(self, key):
+        with self._lock:
+            frame = self._entries.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return frame
+    def _sizeof(self, frame):
+        return frame.data.nbytes
+    def put(self, key, frame):
+        size = self._sizeof(frame)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes_used -= self._sizeof(old)
+            self._entries[key] = frame
+            self.bytes_used += size
+            while self.bytes_used > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes_used -= self._sizeof(evicted)
+                self.evictions += 1
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes_used = 0
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes_used,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+class ImagePrefetcher:
+    # Фоновое декодирование ближайших изображений плейлиста в ImageCache
+    def __init__(self, cache, workers=IMAGE_PREFETCH_WORKERS):
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.prefetched = 0
+    def _load(self, key):
+        path, _, w, h, mode = key
+        try:
+            frame = load_display_image(path, w, h, mode)
+            if frame is not None:
+                self.cache.put(key, frame)
+                self.prefetched += 1
+            return frame
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+    def prefetch(self, paths, w, h, mode=SCALE_STRETCH):
+        for path in paths:
+            key = self.cache.make_key(path, w, h, mode)
+            if key is None or self.cache.contains(key):
+                continue
+            with self._lock:
+                if key in self._pending:
+                    continue
+                self._pending[key] = self._pool.submit(self._load, key)
+    def pending(self, key):
+        with self._lock:
+            return self._pending.get(key)
+    def stats(self):
+        with self._lock:
+            return {'prefetched': self.prefetched, 'pending': len(self._pending)}
+    def shutdown(self):
+        # cancel_futures появился только в Python 3.9 — снимаем очередь вручную
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future in pending:
+            future.cancel()
+        self._pool.shutdown(wait=False)
+
 class PlaylistItem:
-    def __init__(self, path, duration=None, loops=1):
+    def __init__(self, path, duration=None, loops=1, max_fps=None):
         self.path = path
         self.duration = duration
         self.loops = loops
+        self.max_fps = max_fps
         self._current_loop = 0
         self.groups = set()
     def reset(self):
         self._current_loop = 0
 
+class LibraryIndex:
+    # Индексы библиотеки: группа -> номера элементов в all_items и
+    # нормализованный путь (или inode) -> элемент. Очередь строится из
+    # индекса за время, пропорциональное результату, а импорт папки
+    # проверяет дубликаты за O(1) на файл. Изменения групп элементов идут
+    # через add/discard; перестановка элементов требует rebuild().
+    def __init__(self, items=(), by_inode=LIBRARY_INDEX_BY_INODE):
+        self.by_inode = by_inode
+        self._by_group = {}
+        self._by_path = {}
+        self._by_inode = {}
+        self._pos = {}  # id(PlaylistItem) -> номер в all_items
+        self.rebuild(items)
+    def rebuild(self, items):
+        self._by_group = {}
+        self._by_path = {}
+        self._by_inode = {}
+        self._pos = {}
+        for i, pi in enumerate(items):
+            self.append(i, pi)
+    def append(self, index, pi):
+        self._pos[id(pi)] = index
+        self._by_path.setdefault(normalize_path(pi.path), pi)
+        if self.by_inode:
+            identity = file_identity(pi.path)
+            if identity is not None:
+                self._by_inode.setdefault(identity, pi)
+        for g in pi.groups:
+            self._by_group.setdefault(g, set()).add(index)
+    def find(self, path):
+        pi = self._by_path.get(normalize_path(path))
+        if pi is None and self.by_inode:
+            identity = file_identity(path)
+            if identity is not None:
+                pi = self._by_inode.get(identity)
+        return pi
+    def position(self, pi):
+        return self._pos.get(id(pi))
+    def add(self, pi, group):
+        index = self._pos.get(id(pi))
+        if index is not None:
+            self._by_group.setdefault(group, set()).add(index)
+    def discard(self, pi, group):
+        index = self._pos.get(id(pi))
+        members = self._by_group.get(group)
+        if index is not None and members is not None:
+            members.discard(index)
+            if not members:
+                del self._by_group[group]
+    def rename_group(self, old, new):
+        members = self._by_group.pop(old, None)
+        if members:
+            self._by_group.setdefault(new, set()).update(members)
+    def indices(self, groups):
+        # Номера элементов любой из групп в порядке библиотеки
+        found = set()
+        for g in groups:
+            found.update(self._by_group.get(g, ()))
+        return sorted(found)
+    def count(self, group):
+        return len(self._by_group.get(group, ()))
+
+class VideoSurface(QWidget):
+    # Поверхность вывода видео: paintEvent рисует текущий QImage напрямую,
+    # без QLabel/QPixmap, фон не заливается системой
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+        self.setAttribute(Qt.WidgetAttribute.WA_NoSystemBackground)
+        self.scale_mode = SCALE_MODE
+        self._image = None
+        self._layers = OrderedDict()  # зоны поверх основного кадра: имя -> [QRect, кадр]
+        self.layer_paint_ms = {}
+        self.paints = 0
+        self.paint_ms_total = 0.0
+        self.paint_ms_max = 0.0
+    def set_image(self, image):
+        self._image = image
+        self.update()
+    def set_layer(self, name, rect, frame):
+        # Кадр зоны держится, пока не будет заменён; update() Qt склеивает,
+        # поэтому все зоны компонуются за одну отрисовку
+        previous = self._layers.get(name)
+        self._layers[name] = [rect, frame]
+        if previous is not None and previous[1] is not frame:
+            release_frame(previous[1])
+        self.update(rect)
+    def clear_layer(self, name):
+        previous = self._layers.pop(name, None)
+        if previous is not None:
+            release_frame(previous[1])
+            self.update(previous[0])
+    def set_scale_mode(self, mode):
+        self.scale_mode = mode
+        self.update()
+    def target_rect(self, image):
+        x, y, w, h = fit_rect(image.width(), image.height(), self.width(), self.height(), self.scale_mode)
+        return QRect(x, y, w, h)
+    def paintEvent(self, event):
+        t0 = perf_counter()
+        painter = QPainter(self)
+        rect = self.rect()
+        image = self._image
+        if image is None or image.isNull():
+            painter.fillRect(rect, Qt.GlobalColor.black)
+        else:
+            target = self.target_rect(image)
+            if target != rect:
+                painter.fillRect(rect, Qt.GlobalColor.black)
+            if target.size() == image.size():
+                painter.drawImage(target.topLeft(), image)
+            else:
+                painter.drawImage(target, image)
+        for name, (zone_rect, frame) in self._layers.items():
+            if frame is None or not zone_rect.intersects(event.rect()):
+                continue
+            t_layer = perf_counter()
+            painter.fillRect(zone_rect, Qt.GlobalColor.black)
+            if frame.image.size() == zone_rect.size():
+                painter.drawImage(zone_rect.topLeft(), frame.image)
+            else:
+                x, y, w, h = fit_rect(frame.image.width(), frame.image.height(), zone_rect.width(), zone_rect.height(), self.scale_mode)
+                painter.drawImage(QRect(zone_rect.x() + x, zone_rect.y() + y, w, h), frame.image)
+            total, count = self.layer_paint_ms.get(name, (0.0, 0))
+            self.layer_paint_ms[name] = (total + (perf_counter() - t_layer) * 1000, count + 1)
+        painter.end()
+        ms = (perf_counter() - t0) * 1000
+        self.paints += 1
+        self.paint_ms_total += ms
+        self.paint_ms_max = max(self.paint_ms_max, ms)
+
 class VideoWindow(QWidget):
-    def __init__(self, width, height):
+    def __init__(self, width, height, image_cache=None, prefetcher=None, pos=(0, 0), primary=True):
         super().__init__()
         self.win_width = width
         self.win_height = height
-        self.label = QLabel(self)
-        self.label.setFixedSize(width, height)
-        self.label.setStyleSheet("background-color:black;")
+        self.win_pos = tuple(pos)
+        self.primary = primary
+        self.scale_mode = SCALE_MODE
+        self.image_cache = image_cache if image_cache is not None else ImageCache()
+        self.prefetcher = prefetcher if prefetcher is not None else ImagePrefetcher(self.image_cache)
+        self._current_frame = None
+        self.frames_shown = 0
+        self.show_ms_total = 0.0
+        self.surface = VideoSurface(self)
+        self.surface.setFixedSize(width, height)
         layout = QVBoxLayout(self)
         layout.setContentsMargins(0,0,0,0)
-        layout.addWidget(self.label)
+        layout.addWidget(self.surface)
         frameless = getattr(Qt, 'FramelessWindowHint', None)
         stay_on_top = getattr(Qt, 'WindowStaysOnTopHint', None)
         if frameless is not None and stay_on_top is not None:
@@ -151,34 +647,81 @@ class VideoWindow(QWidget):
             self.setWindowFlags(frameless)
         elif stay_on_top is not None:
             self.setWindowFlags(stay_on_top)
-        self.move(0,0)
+        self.move(*self.win_pos)
         self.setCursor(QCursor(Qt.CursorShape.BlankCursor))
     def moveEvent(self, e):
-        self.move(0,0)
+        if (self.x(), self.y()) != self.win_pos:
+            self.move(*self.win_pos)
     def resize_window(self, w, h):
         self.win_width = w
         self.win_height = h
         self.setFixedSize(w, h)
-        self.label.setFixedSize(w, h)
+        self.surface.setFixedSize(w, h)
+    def set_scale_mode(self, mode):
+        self.scale_mode = mode
+        self.surface.set_scale_mode(mode)
     def show_frame(self, frame):
-        h, w = frame.shape[:2]
-        if w != self.win_width or h != self.win_height:
-            f = cv2.resize(frame, (self.win_width, self.win_height))
-        else:
-            f = frame
-        c = cv2.cvtColor(f, cv2.COLOR_BGR2RGB)
-        img = QImage(c.data, c.shape[1], c.shape[0], QImage.Format_RGB888)
-        p = QPixmap.fromImage(img).scaled(self.win_width, self.win_height,
-                                         Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
-        self.label.setPixmap(p)
+        t0 = perf_counter()
+        if not isinstance(frame, DisplayFrame):
+            frame = prepare_display_frame(frame, self.win_width, self.win_height, self.scale_mode)
+        # Кадр под старый размер окна (идёт смена размера) масштабирует сама поверхность
+        self.surface.set_image(frame.image)
+        # Предыдущий кадр больше не на экране — его буфер можно переиспользовать
+        previous, self._current_frame = self._current_frame, frame
+        if previous is not None and previous is not frame:
+            previous.release()
+        self.frames_shown += 1
+        self.show_ms_total += (perf_counter() - t0) * 1000
+    def render_stats(self):
+        # Стоимость кадра в GUI-потоке, мс: приём кадра + отрисовка
+        surface = self.surface
+        return {
+            'frames': self.frames_shown,
+            'show_ms_avg': self.show_ms_total / self.frames_shown if self.frames_shown else 0.0,
+            'paint_ms_avg': surface.paint_ms_total / surface.paints if surface.paints else 0.0,
+            'paint_ms_max': surface.paint_ms_max,
+        }
+    def image_key(self, path):
+        return self.image_cache.make_key(path, self.win_width, self.win_height, self.scale_mode)
+    def try_show_cached(self, path):
+        key = self.image_key(path)
+        frame = self.image_cache.get(key) if key else None
+        if frame is None and key:
+            future = self.prefetcher.pending(key)
+            if future is not None:
+                try:
+                    frame = future.result(timeout=IMAGE_PREFETCH_WAIT_SECONDS)
+                except (CancelledError, FutureTimeoutError):
+                    frame = None
+        if frame is None:
+            return False
+        self.show_frame(frame)
+        return True
     def show_image(self, path):
-        img = cv2.imread(path)
-        if img is None:
-            return
-        self.show_frame(img)
+        if self.try_show_cached(path):
+            return True
+        frame = load_display_image(path, self.win_width, self.win_height, self.scale_mode)
+        if frame is None:
+            return False
+        key = self.image_key(path)
+        if key:
+            self.image_cache.put(key, frame)
+        self.show_frame(frame)
+        return True
+    def show_decoded_image(self, path, img):
+        # Изображение уже декодировано (общий декод для нескольких выходов)
+        frame = prepare_display_frame(img, self.win_width, self.win_height, self.scale_mode)
+        key = self.image_key(path)
+        if key:
+            self.image_cache.put(key, frame)
+        self.show_frame(frame)
+    def prefetch_images(self, paths):
+        self.prefetcher.prefetch(paths, self.win_width, self.win_height, self.scale_mode)
     def closeEvent(self, event):
         from PyQt5.QtWidgets import QApplication
-        QApplication.quit()
+        if self.primary:
+            self.prefetcher.shutdown()
+            QApplication.quit()
         event.accept()
 
 class CheckBoxDelegate(QStyledItemDelegate):
@@ -323,59 +866,1450 @@ class GroupManagerDialog(QDialog):
                 self.group_schedules[new_name] = self.group_schedules.pop(old_name)
                 parent = self.parent()
                 if isinstance(parent, Controller):
-                    for pi in parent.all_items:
-                        if old_name in pi.groups:
-                            pi.groups.remove(old_name)
-                            pi.groups.add(new_name)
+                    for i in parent.library.indices([old_name]):
+                        pi = parent.all_items[i]
+                        pi.groups.discard(old_name)
+                        pi.groups.add(new_name)
+                    parent.library.rename_group(old_name, new_name)
+                    if parent.store is not None:
+                        parent.store.rename_group(old_name, new_name)
+                    # Зоны привязаны к группам по имени
+                    for zone in parent.zones:
+                        zone['groups'] = [new_name if g == old_name else g for g in zone.get('groups', [])]
+                    for player in parent.zone_players.values():
+                        if old_name in player.groups:
+                            player.groups.discard(old_name)
+                            player.groups.add(new_name)
                     parent.save_settings()
                 self.refresh()
                 self.on_update()
 
+class FrameRingBuffer:
+    def __init__(self, capacity=FRAME_BUFFER_SIZE):
+        self.capacity = max(1, int(capacity))
+        self._frames = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.underruns = 0
+        self.max_fill = 0
+        self._delivered = 0
+    def put(self, frame, timeout=None):
+        with self._cond:
+            while len(self._frames) >= self.capacity and not self._closed:
+                if not self._cond.wait(timeout):
+                    return False
+            if self._closed:
+                return False
+            self._frames.append(frame)
+            self.max_fill = max(self.max_fill, len(self._frames))
+            self._cond.notify_all()
+            return True
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._frames and not self._closed:
+                if self._delivered:
+                    self.underruns += 1
+                self._cond.wait_for(lambda: self._frames or self._closed, timeout)
+            if not self._frames:
+                return None
+            frame = self._frames.popleft()
+            self._delivered += 1
+            self._cond.notify_all()
+            return frame
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+    def is_drained(self):
+        with self._cond:
+            return self._closed and not self._frames
+    def fill(self):
+        with self._cond:
+            return len(self._frames)
+    def stats(self):
+        with self._cond:
+            return {
+                'capacity': self.capacity,
+                'fill': len(self._frames),
+                'max_fill': self.max_fill,
+                'underruns': self.underruns,
+            }
+
+class VideoSource:
+    # Открытый контейнер + поток декодера, заполняющий кольцевой буфер.
+    # Источник можно запустить заранее (preroll): декодер откроет файл,
+    # заполнит буфер и будет ждать, пока показ не начнёт забирать кадры.
+    # После конца файла контейнер остаётся открытым: rewind() запускает
+    # следующий цикл без повторного открытия.
+    def __init__(self, path, buffer_size=FRAME_BUFFER_SIZE, max_fps=None):
+        self.path = path
+        self.buffer = FrameRingBuffer(buffer_size)
+        self.fps = 30.0
+        self.max_fps = max_fps
+        self.frames_decoded = 0
+        self.frames_skipped = 0
+        self.cpu_seconds = 0.0
+        self.ok = False
+        self.crashed = False
+        self.opens = 0
+        self.rewinds = 0
+        self._opened = threading.Event()
+        self._rewind = threading.Event()
+        self._eof = False
+        self._running = True
+        self._thread = None
+        self._cap = None
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name='decoder')
+        self._thread.start()
+        return self
+    def _open_stream(self):
+        self.opens += 1
+        self._cap = cv2.VideoCapture(self.path)
+        if not self._cap.isOpened():
+            return False
+        fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps > 0 else 30.0
+        return True
+    def _restart(self):
+        if self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+            return True
+        self._cap.release()
+        return self._open_stream()
+    def _close_stream(self):
+        if self._cap is not None:
+            self._cap.release()
+    def _run(self):
+        try:
+            if not self._open_stream():
+                print(f'[VideoSource] failed to open video {self.path}')
+                return
+            self.ok = True
+            self._opened.set()
+            while self._running:
+                self._decode_loop()
+                self.buffer.close()
+                if not self._running:
+                    break
+                # Конец файла: ждём перемотки на следующий цикл или остановки
+                self._eof = True
+                self._rewind.wait()
+                self._rewind.clear()
+                if not self._running or not self._restart():
+                    break
+        finally:
+            self._opened.set()
+            self.buffer.close()
+            self._close_stream()
+    def _decode_loop(self):
+        # Каждый кадр получает метку времени: PTS из контейнера, а если
+        # бэкенд её не отдаёт — номер кадра / fps.
+        # При ограничении max_fps лишние кадры только пропускаются через
+        # grab(), без retrieve() и преобразования.
+        cap = self._cap
+        index = 0
+        last_pts = -1.0
+        next_keep = None
+        buffer = self.buffer
+        while self._running:
+            if not cap.grab():
+                break
+            pts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if pts <= last_pts or (pts <= 0 and index > 0):
+                pts = index / self.fps
+            last_pts = pts
+            index += 1
+            step = self.output_interval() if self.max_fps else 0.0
+            if next_keep is not None and pts < next_keep - step / 4:
+                self.frames_skipped += 1
+                continue
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            self.frames_decoded += 1
+            self.cpu_seconds = thread_time()
+            if next_keep is None or pts - next_keep > step:
+                next_keep = pts + step
+            else:
+                next_keep += step
+            if not buffer.put((index - 1, pts, frame)):
+                break
+    def release(self, entry):
+        # Кадр из буфера обработан; источникам с общими слотами это сигнал,
+        # что слот можно переписывать
+        pass
+    def output_interval(self):
+        if self.max_fps and self.max_fps < self.fps:
+            return 1.0 / self.max_fps
+        return 1.0 / self.fps
+    def wait_open(self, timeout=None):
+        self._opened.wait(timeout)
+        return self.ok
+    def is_ready(self):
+        return self._opened.is_set() and (self.buffer.fill() > 0 or self.buffer.is_drained())
+    def rewind(self):
+        if not self._running or not self._eof:
+            return False
+        self.buffer = FrameRingBuffer(self.buffer.capacity)
+        self._eof = False
+        self.rewinds += 1
+        self._rewind.set()
+        return True
+    def stop(self):
+        self._running = False
+        self.buffer.close()
+        self._rewind.set()
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+class SharedFrameWriter:
+    # Сторона процесса-декодера: вместо кольцевого буфера VideoSource пишет
+    # кадры в слоты общей памяти и сообщает GUI-процессу номер слота.
+    # Слот возвращается командой 'free' после конвертации кадра.
+    def __init__(self, source, conn):
+        self.source = source
+        self.conn = conn
+        self.shm = None
+        self.views = []
+        self.free = deque()
+        self.rewind_requested = False
+    def attach(self):
+        msg = self.conn.recv()
+        if msg[0] != 'shm':
+            return False
+        _, name, slots, shape = msg
+        from multiprocessing import shared_memory
+        self.shm = shared_memory.SharedMemory(name=name)
+        size = int(np.prod(shape))
+        self.views = [np.ndarray(shape, np.uint8, self.shm.buf, i * size) for i in range(slots)]
+        self.free.extend(range(slots))
+        return True
+    def _handle(self, msg):
+        kind = msg[0]
+        if kind == 'free':
+            self.free.append(msg[1])
+        elif kind == 'max_fps':
+            self.source.max_fps = msg[1]
+        elif kind == 'rewind':
+            self.rewind_requested = True
+        elif kind == 'stop':
+            self.source._running = False
+    def pump(self, block=False):
+        if block:
+            self._handle(self.conn.recv())
+        while self.conn.poll():
+            self._handle(self.conn.recv())
+    def put(self, entry, timeout=None):
+        self.pump()
+        while not self.free and self.source._running:
+            self.pump(block=True)
+        if not self.source._running:
+            return False
+        index, pts, frame = entry
+        slot = self.free.popleft()
+        view = self.views[slot]
+        if frame.shape != view.shape:
+            self.conn.send(('error', f'frame shape {frame.shape} != {view.shape}'))
+            return False
+        np.copyto(view, frame)
+        src = self.source
+        self.conn.send(('frame', slot, index, pts, src.frames_decoded, src.frames_skipped, thread_time()))
+        return True
+    def wait_rewind(self):
+        while self.source._running and not self.rewind_requested:
+            self.pump(block=True)
+        self.rewind_requested = False
+        return self.source._running
+    def close(self):
+        self.views = []
+        if self.shm is not None:
+            self.shm.close()
+
+def decoder_process_main(path, conn, max_fps):
+    # Точка входа процесса-декодера. Переиспользует цикл декодирования
+    # VideoSource, подменяя буфер на запись в общую память.
+    source = VideoSource(path, max_fps=max_fps)
+    writer = source.buffer = SharedFrameWriter(source, conn)
+    try:
+        if not source._open_stream():
+            conn.send(('error', 'failed to open'))
+            return
+        cap = source._cap
+        shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        conn.send(('open', shape, source.fps))
+        if not writer.attach():
+            return
+        while source._running:
+            source._decode_loop()
+            if not source._running:
+                break
+            conn.send(('eof',))
+            if not writer.wait_rewind() or not source._restart():
+                break
+    except (EOFError, OSError):
+        # GUI-процесс закрыл канал — просто выходим
+        pass
+    finally:
+        source._close_stream()
+        writer.close()
+
+class ProcessVideoSource(VideoSource):
+    # Декодер в отдельном процессе: сбой OpenCV/FFmpeg на битом файле не
+    # роняет плеер, а Python-код декодирования не делит GIL с GUI. Кадры
+    # лежат в слотах общей памяти; в буфер попадают представления numpy
+    # без копирования, конвертация выхода читает прямо из слота.
+    # Упавший или зависший процесс помечает источник как crashed —
+    # ролик пропускается, следующий источник запускает новый процесс.
+    def __init__(self, path, buffer_size=FRAME_BUFFER_SIZE, max_fps=None, slots=None):
+        super().__init__(path, buffer_size, max_fps)
+        self.slots = slots or max(DECODER_PROCESS_SLOTS, buffer_size + 2)
+        self._proc = None
+        self._conn = None
+        self._shm = None
+        self._views = []
+        self._slot_of = {}
+        self._send_lock = threading.Lock()
+    def _send(self, msg):
+        with self._send_lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.send(msg)
+            except (OSError, ValueError):
+                pass
+    def _recv(self, timeout):
+        deadline = monotonic() + timeout
+        while self._running:
+            try:
+                if self._conn.poll(0.1):
+                    return self._conn.recv()
+            except (EOFError, OSError):
+                self._mark_crashed('exited')
+                return None
+            if not self._proc.is_alive():
+                self._mark_crashed(f'exited with code {self._proc.exitcode}')
+                return None
+            if monotonic() > deadline:
+                self._mark_crashed(f'no response in {timeout:.0f} s')
+                return None
+        return None
+    def _mark_crashed(self, reason):
+        self.crashed = True
+        print(f'[ProcessVideoSource] decoder process for {self.path} {reason}, item skipped')
+    def _open_stream(self):
+        import multiprocessing
+        from multiprocessing import shared_memory
+        self.opens += 1
+        ctx = multiprocessing.get_context('spawn')
+        self._conn, child_conn = ctx.Pipe()
+        self._proc = ctx.Process(target=decoder_process_main, args=(self.path, child_conn, self.max_fps),
+                                 daemon=True, name='decoder-process')
+        self._proc.start()
+        child_conn.close()
+        msg = self._recv(DECODE_STALL_TIMEOUT)
+        if msg is None or msg[0] != 'open':
+            return False
+        _, shape, self.fps = msg
+        size = int(np.prod(shape))
+        if size <= 0:
+            return False
+        self._shm = shared_memory.SharedMemory(create=True, size=size * self.slots)
+        self._views = [np.ndarray(shape, np.uint8, self._shm.buf, i * size) for i in range(self.slots)]
+        self._slot_of = {id(view): i for i, view in enumerate(self._views)}
+        self._send(('shm', self._shm.name, self.slots, shape))
+        return True
+    def _restart(self):
+        self._send(('rewind',))
+        return True
+    def _decode_loop(self):
+        self._send(('max_fps', self.max_fps))
+        buffer = self.buffer
+        while self._running:
+            msg = self._recv(DECODE_STALL_TIMEOUT)
+            if msg is None:
+                break
+            kind = msg[0]
+            if kind == 'eof':
+                break
+            if kind == 'error':
+                print(f'[ProcessVideoSource] {self.path}: {msg[1]}')
+                self.crashed = True
+                break
+            _, slot, index, pts, self.frames_decoded, self.frames_skipped, self.cpu_seconds = msg
+            frame = self._views[slot]
+            if not PIPELINE_CONVERT_IN_THREAD:
+                # Кадр уйдёт в GUI как есть — слот нельзя держать до отрисовки
+                frame = frame.copy()
+                self._send(('free', slot))
+            if not buffer.put((index, pts, frame)):
+                break
+    def release(self, entry):
+        slot = self._slot_of.get(id(entry[2]))
+        if slot is not None:
+            self._send(('free', slot))
+    def stop(self):
+        super().stop()
+        self._send(('stop',))
+    def _close_stream(self):
+        self._send(('stop',))
+        proc = self._proc
+        if proc is not None:
+            proc.join(1.0)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join(1.0)
+        with self._send_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self._views = []
+        self._slot_of = {}
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError:
+                # Кадры ещё лежат в буфере показа — память освободит сборщик
+                pass
+            self._shm.unlink()
+            self._shm = None
+
+_decoder_process_support = []  # результат однократной проверки: [True] или [False]
+
+def decoder_processes_available():
+    # multiprocessing.shared_memory есть только с Python 3.8; на 3.7 декодер
+    # остаётся в процессе плеера, а не пропускает каждый ролик
+    if not _decoder_process_support:
+        import importlib.util
+        if importlib.util.find_spec('multiprocessing.shared_memory') is not None:
+            _decoder_process_support.append(True)
+        else:
+            print('[open_video_source] multiprocessing.shared_memory недоступен (нужен Python 3.8+), '
+                  'декодирование в процессе плеера')
+            _decoder_process_support.append(False)
+    return _decoder_process_support[0]
+
+def open_video_source(path, buffer_size=FRAME_BUFFER_SIZE, max_fps=None):
+    if DECODER_PROCESS_ENABLED and decoder_processes_available():
+        return ProcessVideoSource(path, buffer_size, max_fps).start()
+    return VideoSource(path, buffer_size, max_fps).start()
+
+class CachedClip:
+    # Кадры ролика, уже подготовленные к выводу: список (pts, кадр)
+    __slots__ = ('path', 'fps', 'frames', 'nbytes', 'compressed')
+    def __init__(self, path, fps, frames, nbytes, compressed):
+        self.path = path
+        self.fps = fps
+        self.frames = frames
+        self.nbytes = nbytes
+        self.compressed = compressed
+
+class ClipFrameCache(ImageCache):
+    def __init__(self, max_bytes=LOOP_CACHE_BYTES):
+        super().__init__(max_bytes)
+    def _sizeof(self, clip):
+        return clip.nbytes
+
+class ClipRecorder:
+    # Записывает кадры первого прохода; при превышении лимитов запись бросается
+    def __init__(self, path, fps, max_bytes=LOOP_CACHE_MAX_CLIP_BYTES,
+                 max_seconds=LOOP_CACHE_MAX_SECONDS, compress=LOOP_CACHE_COMPRESS):
+        self.path = path
+        self.fps = fps
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compress = compress
+        self.frames = []
+        self.nbytes = 0
+    def add(self, pts, frame):
+        if pts > self.max_seconds:
+            return False
+        if self.compress:
+            ok, payload = cv2.imencode('.jpg', cv2.cvtColor(frame.data, cv2.COLOR_RGB2BGR),
+                                       [cv2.IMWRITE_JPEG_QUALITY, LOOP_CACHE_JPEG_QUALITY])
+            if not ok:
+                return False
+            size = payload.nbytes
+        else:
+            payload = frame.detach() if frame.pool is not None else frame
+            size = frame.data.nbytes
+        self.nbytes += size
+        if self.nbytes > self.max_bytes:
+            return False
+        self.frames.append((pts, payload))
+        return True
+    def finish(self):
+        if not self.frames:
+            return None
+        return CachedClip(self.path, self.fps, self.frames, self.nbytes, self.compress)
+
+class MemoryVideoSource(VideoSource):
+    # Повтор ролика из ClipFrameCache: кадры уже в формате вывода,
+    # декодирование с диска и преобразование не нужны
+    def __init__(self, clip, buffer_size=FRAME_BUFFER_SIZE, max_fps=None):
+        super().__init__(clip.path, buffer_size, max_fps)
+        self.clip = clip
+    def _open_stream(self):
+        self.fps = self.clip.fps
+        return True
+    def _restart(self):
+        return True
+    def _close_stream(self):
+        pass
+    def _decode_loop(self):
+        buffer = self.buffer
+        for index, (pts, payload) in enumerate(self.clip.frames):
+            if not self._running:
+                break
+            if self.clip.compressed:
+                img = cv2.imdecode(payload, cv2.IMREAD_COLOR)
+                if img is None:
+                    break
+                payload = prepare_display_frame(img, img.shape[1], img.shape[0])
+            if not buffer.put((index, pts, payload)):
+                break
+
+class DecoderReaper:
+    # Остановленные декодеры завершаются в фоне: никто их не ждёт.
+    # Декодер, застрявший в cap.read() дольше таймаута, бросается
+    # (поток демонический) и учитывается в статистике.
+    def __init__(self, timeout=DECODER_REAP_TIMEOUT):
+        self.timeout = timeout
+        self._orphans = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.reaped = 0
+        self.abandoned = 0
+        self._thread = threading.Thread(target=self._run, daemon=True, name='reaper')
+        self._thread.start()
+    def add(self, source):
+        source.stop()
+        with self._lock:
+            self._orphans.append((source, monotonic() + self.timeout))
+        self._wake.set()
+    def _run(self):
+        while True:
+            self._wake.wait(0.5 if self.pending() else None)
+            self._wake.clear()
+            self.reap()
+    def reap(self):
+        now = monotonic()
+        with self._lock:
+            alive = []
+            for source, deadline in self._orphans:
+                if not source.is_alive():
+                    self.reaped += 1
+                elif now >= deadline:
+                    self.abandoned += 1
+                    print(f'[DecoderReaper] decoder for {source.path} did not stop in {self.timeout:.0f} s, abandoned')
+                else:
+                    alive.append((source, deadline))
+            self._orphans = alive
+    def pending(self):
+        with self._lock:
+            return len(self._orphans)
+    def drain(self, timeout):
+        # Выход из программы: дождаться закрытия источников, чтобы процессы
+        # декодеров завершились, а общая память была освобождена (unlink)
+        deadline = monotonic() + timeout
+        with self._lock:
+            orphans = [source for source, _ in self._orphans]
+        for source in orphans:
+            source.join(max(0.0, deadline - monotonic()))
+        self.reap()
+    def stats(self):
+        return {'pending': self.pending(), 'reaped': self.reaped, 'abandoned': self.abandoned}
+
+class FrameMailbox:
+    # Передача кадров в GUI без очереди: хранится только самый свежий кадр.
+    # post() возвращает True, только если ящик был пуст — значит, GUI ещё
+    # не уведомлён и нужно послать сигнал; иначе кадр просто заменяется.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slot = None
+        self.posted = 0
+        self.taken = 0
+        self.overwritten = 0
+    def post(self, token, frame):
+        with self._lock:
+            was_empty = self._slot is None
+            if not was_empty:
+                self.overwritten += 1
+                release_frame(self._slot[1])
+            self._slot = (token, frame)
+            self.posted += 1
+            return was_empty
+    def take(self):
+        with self._lock:
+            entry, self._slot = self._slot, None
+            if entry is not None:
+                self.taken += 1
+            return entry
+    def clear(self):
+        with self._lock:
+            if self._slot is not None:
+                release_frame(self._slot[1])
+            self._slot = None
+    def stats(self):
+        with self._lock:
+            return {'posted': self.posted, 'taken': self.taken, 'overwritten': self.overwritten}
+
+class OutputSink:
+    # Один выход видео со своим размером: пул буферов и почтовый ящик.
+    # Декодирование общее, масштабирование — один раз на выход.
+    def __init__(self, w, h, mode=SCALE_STRETCH):
+        self.pool = FrameBufferPool(w, h, mode=mode)
+        self.mailbox = FrameMailbox()
+        self.frames = 0
+        self.convert_ms_total = 0.0
+    def convert(self, frame):
+        t0 = perf_counter()
+        out = self.pool.convert(frame)
+        self.convert_ms_total += (perf_counter() - t0) * 1000
+        self.frames += 1
+        return out
+    def stats(self):
+        return {
+            'size': (self.pool.w, self.pool.h),
+            'frames': self.frames,
+            'convert_ms_avg': self.convert_ms_total / self.frames if self.frames else 0.0,
+            'allocations': self.pool.allocations,
+            'mailbox': self.mailbox.stats(),
+        }
+
+class PlayCommand:
+    __slots__ = ('token', 'path', 'source', 'start_at', 'loop_cache', 'max_fps')
+    def __init__(self, token, path=None, source=None, start_at=None, loop_cache=False, max_fps=None):
+        self.token = token
+        self.path = path
+        self.source = source
+        self.start_at = start_at
+        self.loop_cache = loop_cache
+        self.max_fps = max_fps
+
 class VideoThread(QThread):
-    frame_ready = pyqtSignal(object)
-    video_finished = pyqtSignal()
-    def __init__(self, video_path, target_w, target_h, max_fps=24):
+    # Долгоживущий поток показа: принимает команды «играть файл» через очередь
+    # и переиспользуется между роликами и циклами. Сигналы несут токен
+    # команды, чтобы контроллер отбрасывал события уже заменённых роликов.
+    frame_ready = pyqtSignal(int)
+    first_frame_shown = pyqtSignal(int, float)
+    video_finished = pyqtSignal(int, int)
+    def __init__(self, target_w, target_h, max_fps=MAX_FPS, buffer_size=FRAME_BUFFER_SIZE, loop_cache=None):
         super().__init__()
-        self.video_path = video_path
+        self.video_path = None
         self.target_w = target_w
         self.target_h = target_h
-        self.max_fps = None
-        self._running = True
+        self.max_fps = max_fps
+        self.buffer_size = buffer_size
+        self._target_size = (target_w, target_h)
+        self._commands = queue.Queue()
+        self._token = 0
+        self._source = None
+        self._parked = None
+        self.reaper = DecoderReaper()
+        self.loop_cache = loop_cache if loop_cache is not None else ClipFrameCache()
+        self.sinks = [OutputSink(target_w, target_h)]
+        self._fanout = None
         self.frames_shown = 0
-        print(f'[VideoThread] __init__: video_path={video_path}, target_w={target_w}, target_h={target_h}')
+        self.frames_dropped = 0
+        self.frames_late = 0
+        self.interval = 1.0 / 30
+        self.last_frame_time = None
+        self.next_deadline = None
+        self.completed = False
+        self.items_played = 0
+        self.sources_reused = 0
+        self._decode_base = (0, 0)
+        self._alloc_base = 0
+        self.present_cpu_total = 0.0
+        self.decode_cpu_total = 0.0
+        self.decoder_crashes = 0
+        print(f'[VideoThread] __init__: target_w={target_w}, target_h={target_h}, buffer={buffer_size}')
+    def play(self, video_path, source=None, start_at=None, loop_cache=False, max_fps=None):
+        self._token += 1
+        self._interrupt()
+        self._commands.put(PlayCommand(self._token, video_path, source, start_at, loop_cache, max_fps or self.max_fps))
+        return self._token
+    def stop_current(self):
+        self._token += 1
+        self._interrupt()
+        self._commands.put(PlayCommand(self._token))
+    def shutdown(self):
+        self._token += 1
+        self._interrupt()
+        self._commands.put(None)
+        if not self.wait(VIDEO_SHUTDOWN_TIMEOUT_MS):
+            print('[VideoThread] shutdown: worker did not finish in time')
+        self.reaper.drain(VIDEO_SHUTDOWN_TIMEOUT_MS / 1000)
+    def retire(self, source):
+        # Неблокирующая остановка: источник доработает и закроется в фоне
+        if source is not None:
+            self.reaper.add(source)
+    def _interrupt(self):
+        source = self._source
+        if source is not None:
+            source.stop()
+    def _release_parked(self):
+        parked, self._parked = self._parked, None
+        self.retire(parked)
     def run(self):
-        import cv2, time
-        print(f'[VideoThread] run: starting video {self.video_path}')
-        cap = cv2.VideoCapture(self.video_path)
-        if not cap.isOpened():
-            print(f'[VideoThread] run: failed to open video {self.video_path}')
-            self.video_finished.emit()
-            return
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        if fps <= 0:
-            fps = 30
-        interval = 1.0 / fps
-        last_time = time.time()
+        print('[VideoThread] run: worker started')
+        while True:
+            cmd = self._commands.get()
+            if cmd is None:
+                break
+            if cmd.token != self._token or cmd.path is None:
+                self.retire(cmd.source)
+                if cmd.path is None:
+                    self._release_parked()
+                continue
+            self._play(cmd)
+        self._release_parked()
+        print(f'[VideoThread] run: worker finished, items played: {self.items_played}, sources reused: {self.sources_reused}, '
+              f'reaper: {self.reaper.stats()}, outputs: {[sink.stats() for sink in self.sinks]}')
+    def _acquire_source(self, cmd):
+        if len(self.sinks) > 1:
+            cmd.loop_cache = False
+        parked, self._parked = self._parked, None
+        if cmd.loop_cache and cmd.source is None and not isinstance(parked, MemoryVideoSource):
+            key = self.loop_cache.make_key(cmd.path, *self._target_size, self.sinks[0].pool.mode)
+            clip = self.loop_cache.get(key) if key else None
+            if clip is not None:
+                self.retire(parked)
+                return MemoryVideoSource(clip, self.buffer_size).start()
+        if cmd.source is None and parked is not None and parked.path == cmd.path and parked.rewind():
+            self.sources_reused += 1
+            parked.max_fps = cmd.max_fps
+            return parked
+        self.retire(parked)
+        if cmd.source is not None:
+            cmd.source.max_fps = cmd.max_fps
+            return cmd.source
+        return open_video_source(cmd.path, self.buffer_size, cmd.max_fps)
+    def _play(self, cmd):
+        self.video_path = cmd.path
+        print(f'[VideoThread] run: starting video {cmd.path}')
+        source = self._source = self._acquire_source(cmd)
+        if cmd.token != self._token:
+            source.stop()
         self.frames_shown = 0
-        while self._running and cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                print(f'[VideoThread] run: end of video or read error for {self.video_path}')
+        self.frames_dropped = 0
+        self.frames_late = 0
+        self.completed = False
+        self.last_frame_time = None
+        self.next_deadline = None
+        self._decode_base = (source.frames_decoded, source.frames_skipped)
+        self._alloc_base = self.render_allocations()
+        cpu_start = thread_time()
+        decode_cpu_start = source.cpu_seconds
+        # Открытие ждём порциями, чтобы новая команда не ждала зависший файл
+        opened_by = monotonic() + DECODE_STALL_TIMEOUT
+        while not source.wait_open(0.1):
+            if cmd.token != self._token or monotonic() > opened_by:
+                break
+        if not source.ok:
+            print(f'[VideoThread] run: failed to open video {cmd.path}')
+            self._source = None
+            self.retire(source)
+            self.video_finished.emit(cmd.token, 0)
+            return
+        buffer = source.buffer
+        interval = self.interval = source.output_interval()
+        recorder = None
+        cache_key = None
+        if cmd.loop_cache and not isinstance(source, MemoryVideoSource):
+            cache_key = self.loop_cache.make_key(cmd.path, *self._target_size, self.sinks[0].pool.mode)
+            if cache_key and not self.loop_cache.contains(cache_key):
+                recorder = ClipRecorder(cmd.path, source.fps)
+        # Часы показа привязаны к монотонному времени первого кадра:
+        # срок кадра = origin + pts, ошибки сна не накапливаются.
+        # start_at задаёт границу кадра предыдущего ролика для бесшовного стыка.
+        origin = None
+        last_entry = monotonic()
+        while cmd.token == self._token:
+            entry = buffer.get(timeout=0.5)
+            if entry is None:
+                if buffer.is_drained():
+                    if cmd.token == self._token:
+                        print(f'[VideoThread] run: end of video or read error for {cmd.path}')
+                        self.completed = True
+                    break
+                if monotonic() - last_entry > DECODE_STALL_TIMEOUT:
+                    print(f'[VideoThread] run: decoder stalled on {cmd.path}, giving up')
+                    break
+                continue
+            last_entry = monotonic()
+            index, pts, frame = entry
+            now = monotonic()
+            if origin is None:
+                start = cmd.start_at if cmd.start_at is not None and cmd.start_at > now - interval else now
+                origin = start - pts
+            deadline = origin + pts
+            if now > deadline + interval and self.frames_shown:
+                # Отстаём больше чем на кадр — пропускаем, а не замедляемся
+                self.frames_dropped += 1
+                recorder = None
+                source.release(entry)
+                continue
+            sinks = self.sinks
+            if isinstance(frame, DisplayFrame):
+                # Готовый кадр из кэша циклов — только для основного выхода
+                outs = [frame]
+            elif PIPELINE_CONVERT_IN_THREAD:
+                outs = self._convert_for_outputs(frame, sinks)
+            else:
+                outs = [frame] * len(sinks)
+            source.release(entry)
+            frame = outs[0]
+            if recorder is not None:
+                if not isinstance(frame, DisplayFrame) or frame.size() != (cache_key[2], cache_key[3]) or not recorder.add(pts, frame):
+                    recorder = None
+            now = monotonic()
+            if now < deadline:
+                sleep(deadline - now)
+            elif now - deadline > interval / 2:
+                self.frames_late += 1
+            if cmd.token != self._token:
+                for out in outs:
+                    release_frame(out)
                 break
             self.frames_shown += 1
-            self.frame_ready.emit(frame)
-            elapsed = time.time() - last_time
-            sleep_time = interval - elapsed
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-            last_time = time.time()
-        cap.release()
-        print(f'[VideoThread] run: finished video {self.video_path}, frames shown: {self.frames_shown}')
-        self.video_finished.emit()
+            for i, (sink, out) in enumerate(zip(sinks, outs)):
+                if sink.mailbox.post(cmd.token, out):
+                    self.frame_ready.emit(i)
+            self.last_frame_time = monotonic()
+            self.next_deadline = deadline + interval
+            if self.frames_shown == 1:
+                self.first_frame_shown.emit(cmd.token, self.last_frame_time)
+        self.present_cpu_total += thread_time() - cpu_start
+        self.decode_cpu_total += max(0.0, source.cpu_seconds - decode_cpu_start)
+        if source.crashed:
+            self.completed = False
+            self.decoder_crashes += 1
+        stats = self.stats()
+        self._source = None
+        if self.completed and recorder is not None:
+            clip = recorder.finish()
+            if clip is not None:
+                self.loop_cache.put(cache_key, clip)
+                print(f'[VideoThread] loop cache: stored {len(clip.frames)} frames of {cmd.path}, {self.loop_cache.stats()}')
+        if self.completed:
+            # Контейнер остаётся открытым для возможного следующего цикла
+            self._parked = source
+        else:
+            self.retire(source)
+        self.items_played += 1
+        print(f'[VideoThread] run: finished video {cmd.path}, {stats}')
+        # После сбоя декодера ролик не повторяется: 0 кадров — сигнал пропустить
+        self.video_finished.emit(cmd.token, 0 if source.crashed else self.frames_shown)
+    def _convert_for_outputs(self, frame, sinks):
+        if len(sinks) == 1:
+            return [sinks[0].convert(frame)]
+        # cv2 отпускает GIL, поэтому выходы масштабируются параллельно
+        if self._fanout is None:
+            self._fanout = ThreadPoolExecutor(max_workers=4, thread_name_prefix='fanout')
+        return list(self._fanout.map(lambda sink: sink.convert(frame), sinks))
+    def add_output(self, w, h, mode=SCALE_STRETCH):
+        self.sinks = self.sinks + [OutputSink(w, h, mode)]
+        return len(self.sinks) - 1
+    def remove_extra_outputs(self):
+        for sink in self.sinks[1:]:
+            sink.mailbox.clear()
+        self.sinks = self.sinks[:1]
+    def set_target_size(self, w, h, output=0):
+        if output == 0:
+            self.target_w = w
+            self.target_h = h
+            self._target_size = (w, h)
+        self.sinks[output].pool.resize(w, h)
+    def set_scale_mode(self, mode):
+        for sink in self.sinks:
+            sink.pool.resize(sink.pool.w, sink.pool.h, mode)
+    def render_allocations(self):
+        return sum(sink.pool.allocations for sink in self.sinks)
+    def buffer_stats(self):
+        source = self._source
+        return source.buffer.stats() if source is not None else None
+    def stats(self):
+        source = self._source
+        decoded = skipped = None
+        if source is not None:
+            decoded = source.frames_decoded - self._decode_base[0]
+            skipped = source.frames_skipped - self._decode_base[1]
+        return {
+            'shown': self.frames_shown,
+            'decoded': decoded,
+            'skipped': skipped,
+            'dropped': self.frames_dropped,
+            'late': self.frames_late,
+            'render_allocs': self.render_allocations() - self._alloc_base,
+            'buffer': self.buffer_stats(),
+            'decoder_crashes': self.decoder_crashes,
+        }
+
+class SettingsWriter(QObject):
+    # Отложенная запись настроек: save_settings() только помечает состояние
+    # изменённым, все изменения за окно задержки сливаются в одну запись.
+    # Снимок берётся в GUI-потоке, JSON и запись на диск — в фоновом потоке;
+    # файл пишется во временный и атомарно подменяется через os.replace.
+    def __init__(self, path, snapshot, delay_ms=SETTINGS_SAVE_DELAY_MS, parent=None, store=None):
+        super().__init__(parent)
+        self.path = path
+        self.snapshot = snapshot
+        self.store = store
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self.flush)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='settings')
+        self._lock = threading.Lock()
+        self._recent = deque()  # (время, байт) записей за последнюю минуту
+        self._last_report = monotonic()
+        self.requests = 0
+        self.writes = 0
+        self.bytes_written = 0
+    def request(self):
+        self.requests += 1
+        if not self._timer.isActive():
+            self._timer.start()
+    def pending(self):
+        return self._timer.isActive()
+    def flush(self, wait=False):
+        self._timer.stop()
+        future = self._executor.submit(self._write, self.snapshot())
+        if wait:
+            future.result()
+    def cancel(self):
+        # Отменить отложенную запись и дождаться уже начатой
+        self._timer.stop()
+        self._executor.submit(lambda: None).result()
+    def close(self):
+        if self.pending():
+            self.flush(wait=True)
+        self._executor.shutdown(wait=True)
+        print(f'[SettingsWriter] {self.stats()}')
+    def _write_file(self, data):
+        tmp_path = self.path + '.tmp'
+        payload = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return len(payload)
+    def _write(self, data):
+        try:
+            if self.store is not None:
+                size = self.store.save_state(data)
+            else:
+                size = self._write_file(data)
+        except Exception as e:
+            print('Ошибка сохранения настроек:', e)
+            return
+        now = monotonic()
+        with self._lock:
+            self.writes += 1
+            self.bytes_written += size
+            self._recent.append((now, size))
+            while self._recent and now - self._recent[0][0] > 60:
+                self._recent.popleft()
+            report = now - self._last_report >= 60
+            if report:
+                self._last_report = now
+        if report:
+            print(f'[SettingsWriter] {self.stats()}')
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'writes': self.writes,
+                'bytes': self.bytes_written,
+                'writes_last_min': len(self._recent),
+                'bytes_last_min': sum(size for _, size in self._recent),
+            }
+
+class PlayLogWriter:
+    # Лог воспроизведения пишется фоновым потоком: GUI только добавляет
+    # строку в очередь. Пачка сбрасывается на диск (с fsync) не реже
+    # PLAY_LOG_FLUSH_SECONDS, поэтому при сбое теряется не больше одного
+    # окна. Файл ротируется по размеру и по смене даты, архивы сжимаются gzip.
+    def __init__(self, path, flush_seconds=PLAY_LOG_FLUSH_SECONDS, max_bytes=PLAY_LOG_MAX_BYTES,
+                 rotate_daily=PLAY_LOG_ROTATE_DAILY, keep=PLAY_LOG_KEEP_ARCHIVES):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.keep = keep
+        self._pending = []
+        self._cond = threading.Condition()
+        self._file_lock = threading.Lock()
+        self._flush_requested = False
+        self._taken_seq = 0  # номер последней забранной потоком пачки
+        self._flushed_seq = 0  # номер последней записанной пачки
+        self._closed = False
+        self._file_date = self._current_file_date()
+        self.records = 0
+        self.flushes = 0
+        self.rotations = 0
+        self._thread = threading.Thread(target=self._run, daemon=True, name='playlog')
+        self._thread.start()
+    def _current_file_date(self):
+        try:
+            return datetime.fromtimestamp(os.path.getmtime(self.path)).date()
+        except OSError:
+            return date.today()
+    def write(self, line):
+        with self._cond:
+            self._pending.append(line)
+            self.records += 1
+    def flush(self, timeout=5.0):
+        # Синхронный сброс: для просмотра логов и выхода
+        with self._cond:
+            target = self._taken_seq + 1
+            self._flush_requested = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._flushed_seq >= target or not self._thread.is_alive(), timeout)
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(5.0)
+        print(f'[PlayLogWriter] records: {self.records}, flushes: {self.flushes}, rotations: {self.rotations}')
+    def truncate(self):
+        # Очистка логов: текущий файл и архивы
+        self.flush()
+        with self._file_lock:
+            with open(self.path, 'w', encoding='utf-8'):
+                pass
+            for archive in self.archives():
+                os.remove(archive)
+    def archives(self):
+        # Архивы по порядку ротации: имя logs-ГГГГММДД-ЧЧММСС[-N].txt.gz,
+        # при сортировке строками суффикс -N оказался бы раньше основного имени
+        import glob
+        base, ext = os.path.splitext(self.path)
+        return sorted(glob.glob(f'{glob.escape(base)}-*{ext}.gz'), key=self._archive_order)
+    def _archive_stamp(self, archive):
+        # 'ГГГГММДД-ЧЧММСС[-N]' из имени архива
+        base, ext = os.path.splitext(os.path.basename(self.path))
+        return os.path.basename(archive)[len(base) + 1:-len(ext + '.gz')]
+    def _archive_order(self, archive):
+        stamp = self._archive_stamp(archive)
+        suffix = stamp[16:]
+        try:
+            rotated = datetime.strptime(stamp[:15], '%Y%m%d-%H%M%S')
+        except ValueError:
+            rotated = datetime.min
+        return rotated, int(suffix) if suffix.isdigit() else 0, archive
+    def _archive_date(self, archive):
+        try:
+            return datetime.strptime(self._archive_stamp(archive)[:8], '%Y%m%d').date()
+        except ValueError:
+            return None
+    def read_lines(self, start=None, end=None):
+        # Строки текущего файла и архивов, пересекающих период [start, end]
+        # (даты, None — без границы). Архив содержит записи между моментом
+        # предыдущей ротации и своим, поэтому старые архивы не распаковываются.
+        import gzip
+        self.flush()
+        lines = []
+        with self._file_lock:
+            previous = None
+            sources = []
+            for archive in self.archives():
+                rotated = self._archive_date(archive)
+                if rotated is None or ((start is None or rotated >= start) and (end is None or previous is None or previous <= end)):
+                    sources.append(archive)
+                previous = rotated or previous
+            # Сразу после ротации текущего файла ещё нет
+            if os.path.exists(self.path) and (end is None or previous is None or previous <= end):
+                sources.append(self.path)
+            for path in sources:
+                try:
+                    opener = gzip.open if path.endswith('.gz') else open
+                    with opener(path, 'rt', encoding='utf-8') as f:
+                        lines.extend(line.strip() for line in f if line.strip())
+                except (OSError, EOFError) as e:
+                    print(f'Ошибка чтения лога {path}:', e)
+        return lines
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._flush_requested, self.flush_seconds)
+                batch, self._pending = self._pending, []
+                self._flush_requested = False
+                self._taken_seq += 1
+                seq = self._taken_seq
+                closing = self._closed
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    print('Ошибка записи лога:', e)
+            with self._cond:
+                self._flushed_seq = seq
+                self._cond.notify_all()
+            if closing:
+                break
+    def _write_batch(self, batch):
+        with self._file_lock:
+            if self.rotate_daily and self._file_date != date.today():
+                self._rotate()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(batch))
+                f.flush()
+                os.fsync(f.fileno())
+            self.flushes += 1
+            if os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+    def _rotate(self):
+        import gzip, shutil
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            base, ext = os.path.splitext(self.path)
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            archive = f"{base}-{stamp}{ext}"
+            n = 1
+            while os.path.exists(archive + '.gz'):
+                archive = f"{base}-{stamp}-{n}{ext}"
+                n += 1
+            os.replace(self.path, archive)
+            with open(archive, 'rb') as src, gzip.open(archive + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(archive)
+            self.rotations += 1
+            archives = self.archives()
+            for old in archives[:-self.keep] if self.keep else []:
+                os.remove(old)
+        self._file_date = date.today()
+
+class LibraryStore:
+    # Необязательное хранилище в SQLite: элементы, членство в группах,
+    # группы с расписаниями и состояние интерфейса в отдельных таблицах.
+    # Изменение элемента — одна короткая транзакция по его строкам;
+    # состояние интерфейса пишется только по изменившимся ключам.
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS items (
+            path TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            duration INTEGER,
+            loops INTEGER NOT NULL DEFAULT 1,
+            max_fps INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS items_position ON items (position);
+        CREATE TABLE IF NOT EXISTS item_groups (
+            path TEXT NOT NULL REFERENCES items (path) ON DELETE CASCADE,
+            group_name TEXT NOT NULL,
+            PRIMARY KEY (path, group_name)
+        );
+        CREATE INDEX IF NOT EXISTS item_groups_group ON item_groups (group_name);
+        CREATE TABLE IF NOT EXISTS groups (
+            name TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            schedule TEXT
+        );
+        CREATE TABLE IF NOT EXISTS ui_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    '''
+    def __init__(self, path=LIBRARY_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        import sqlite3
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA foreign_keys=ON')
+        self._conn.executescript(self.SCHEMA)
+        self._state = {key: value for key, value in self._conn.execute('SELECT key, value FROM ui_state')}
+        self._groups = None
+    def is_empty(self):
+        with self._lock:
+            return not self._state and self._conn.execute('SELECT 1 FROM items LIMIT 1').fetchone() is None
+    def load(self):
+        # Тот же словарь, что и в settings.json, чтобы load_settings не различал хранилища
+        with self._lock:
+            data = {key: json.loads(value) for key, value in self._state.items()}
+            rows = self._conn.execute('SELECT name, schedule FROM groups ORDER BY position').fetchall()
+            data['groups'] = [name for name, _ in rows]
+            data['group_schedules'] = {name: json.loads(sch) if sch else None for name, sch in rows}
+            self._groups = rows
+            memberships = {}
+            for path, group in self._conn.execute('SELECT path, group_name FROM item_groups'):
+                memberships.setdefault(path, []).append(group)
+            data['files'] = [
+                {'path': path, 'duration': duration, 'loops': loops, 'max_fps': max_fps, 'groups': memberships.get(path, [])}
+                for path, duration, loops, max_fps in self._conn.execute(
+                    'SELECT path, duration, loops, max_fps FROM items ORDER BY position, rowid')
+            ]
+        return data
+    def import_data(self, data):
+        self.save_state(data)
+        self.save_items(enumerate(data.get('files', [])))
+    def save_state(self, data):
+        # Пишет всё, кроме элементов библиотеки; возвращает число записанных байт
+        written = 0
+        groups = data.get('groups', [])
+        schedules = data.get('group_schedules', {})
+        rows = [(name, json.dumps(schedules.get(name), ensure_ascii=False) if schedules.get(name) else None) for name in groups]
+        with self._lock, self._conn:
+            if rows != self._groups:
+                self._conn.execute('DELETE FROM groups')
+                self._conn.executemany('INSERT INTO groups (name, position, schedule) VALUES (?, ?, ?)',
+                                       [(name, i, sch) for i, (name, sch) in enumerate(rows)])
+                self._groups = rows
+                written += sum(len(name) + len(sch or '') for name, sch in rows)
+            for key, value in data.items():
+                if key in ('files', 'groups', 'group_schedules'):
+                    continue
+                encoded = json.dumps(value, ensure_ascii=False)
+                if self._state.get(key) != encoded:
+                    self._conn.execute('INSERT OR REPLACE INTO ui_state (key, value) VALUES (?, ?)', (key, encoded))
+                    self._state[key] = encoded
+                    written += len(key) + len(encoded)
+        return written
+    def save_items(self, positioned):
+        # positioned: пары (позиция, PlaylistItem или словарь serialize_item)
+        with self._lock, self._conn:
+            for position, pi in positioned:
+                d = pi if isinstance(pi, dict) else {
+                    'path': pi.path, 'duration': pi.duration, 'loops': pi.loops, 'max_fps': pi.max_fps, 'groups': pi.groups}
+                self._conn.execute(
+                    'INSERT INTO items (path, position, duration, loops, max_fps) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (path) DO UPDATE SET duration = excluded.duration, loops = excluded.loops, max_fps = excluded.max_fps',
+                    (d['path'], position if position is not None else 0, d.get('duration'), d.get('loops', 1), d.get('max_fps')))
+                self._conn.execute('DELETE FROM item_groups WHERE path = ?', (d['path'],))
+                self._conn.executemany('INSERT INTO item_groups (path, group_name) VALUES (?, ?)',
+                                       [(d['path'], g) for g in d.get('groups', ())])
+    def delete_items(self, paths):
+        # Членство в группах удаляется каскадом (ON DELETE CASCADE)
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM items WHERE path = ?', [(path,) for path in paths])
+    def reorder(self, items):
+        with self._lock, self._conn:
+            self._conn.executemany('UPDATE items SET position = ? WHERE path = ?',
+                                   [(i, pi.path) for i, pi in enumerate(items)])
+    def rename_group(self, old, new):
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE OR IGNORE item_groups SET group_name = ? WHERE group_name = ?', (new, old))
+            self._conn.execute('DELETE FROM item_groups WHERE group_name = ?', (old,))
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class Scheduler(QObject):
+    # Единое ядро планирования: куча ближайших событий (границы расписаний,
+    # интервальные группы, длительности элементов) и один таймер на самое
+    # раннее из них. У события есть ключ: повторное планирование заменяет
+    # прежний срок, отменённые записи выбрасываются из кучи лениво.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._heap = []
+        self._events = {}  # ключ -> (seq, срок по monotonic, callback)
+        self._seq = 0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.timeout.connect(self._fire)
+        self.wakeups = 0
+        self.fired = 0
+    def schedule(self, key, delay, callback):
+        self._seq += 1
+        deadline = monotonic() + max(0.0, delay)
+        self._events[key] = (self._seq, deadline, callback)
+        heapq.heappush(self._heap, (deadline, self._seq, key))
+        self._arm()
+    def cancel(self, key):
+        if self._events.pop(key, None) is not None:
+            self._arm()
+    def pending(self, key):
+        return key in self._events
+    def remaining(self, key):
+        event = self._events.get(key)
+        return max(0.0, event[1] - monotonic()) if event else None
+    def clear(self):
+        self._heap = []
+        self._events = {}
+        self._timer.stop()
+    def _is_live(self, item):
+        event = self._events.get(item[2])
+        return event is not None and event[0] == item[1]
+    def _arm(self):
+        heap = self._heap
+        while heap and not self._is_live(heap[0]):
+            heapq.heappop(heap)
+        if not heap:
+            self._timer.stop()
+            return
+        ms = int((heap[0][0] - monotonic()) * 1000) + 1
+        self._timer.start(min(max(ms, 0), 2 ** 31 - 1))
+    def _fire(self):
+        self.wakeups += 1
+        heap = self._heap
+        while heap and heap[0][0] <= monotonic():
+            item = heapq.heappop(heap)
+            if not self._is_live(item):
+                continue
+            _, _, callback = self._events.pop(item[2])
+            self.fired += 1
+            callback()
+        self._arm()
+    def stats(self):
+        return {'pending': len(self._events), 'heap': len(self._heap), 'wakeups': self.wakeups, 'fired': self.fired}
+
+class ZonePlayer(QObject):
+    # Зона экрана (боковая ротация изображений, баннер и т.п.) со своим
+    # плейлистом по группам и своим потоком декодирования. Кадры зоны
+    # рисуются слоем поверх основного видео в VideoSurface.
+    image_ready = pyqtSignal(object, object)  # ключ кэша, future фонового декода
+    def __init__(self, controller, name, rect, groups):
+        super().__init__(controller)
+        self.controller = controller
+        self.name = name
+        self.rect = QRect(*[int(v) for v in rect])
+        self.groups = set(groups)
+        self.ord = []
+        self.idx = -1
+        self.token = None
+        self.current = None
+        self.loop = 0  # счётчик повторов свой: элементы общие с основным плейлистом
+        self._image_key = None
+        self.items_played = 0
+        self.image_ready.connect(self.on_image_ready)
+        self.worker = VideoThread(self.rect.width(), self.rect.height(), loop_cache=controller.loop_cache)
+        self.worker.frame_ready.connect(self.on_frame_ready)
+        self.worker.video_finished.connect(self.on_video_finished)
+        self.worker.start()
+        self.key = ('zone', name)
+    @property
+    def surface(self):
+        return self.controller.video_win.surface
+    def build_queue(self):
+        active = set()
+        for g in self.groups:
+            sch = self.controller.group_schedules.get(g)
+            if sch is None or sch.is_active_now():
+                active.add(g)
+        return self.controller.library.indices(active)
+    def start(self):
+        self.ord = self.build_queue()
+        self.idx = -1
+        print(f'[ZONE {self.name}] старт, файлов: {len(self.ord)}')
+        self.next_item()
+    def schedule_next(self, ms):
+        self.controller.scheduler.schedule(self.key, ms / 1000, self.next_item)
+    def next_item(self):
+        self.controller.scheduler.cancel(self.key)
+        self._image_key = None
+        self.current = None
+        self.idx += 1
+        if self.idx >= len(self.ord):
+            self.ord = self.build_queue()
+            self.idx = 0
+        if not self.ord:
+            self.worker.stop_current()
+            self.token = None
+            self.surface.clear_layer(self.name)
+            # Пустая зона ждёт смены расписания: контроллер перезапустит её
+            return
+        pi = self.controller.all_items[self.ord[self.idx]]
+        self.items_played += 1
+        self.current = pi
+        self.loop = 0
+        ext = os.path.splitext(pi.path)[1].lower()
+        if ext in SUPPORTED_VIDEO_EXTS:
+            self.play_current()
+            if pi.duration:
+                self.schedule_next(pi.duration)
+        else:
+            self.worker.stop_current()
+            self.token = None
+            self.show_image(pi.path)
+            self.schedule_next(pi.duration if pi.duration is not None else 3000)
+        self.prefetch_next()
+    def play_current(self):
+        pi = self.current
+        loop_cache = LOOP_CACHE_ENABLED and pi.loops != 1
+        self.token = self.worker.play(pi.path, loop_cache=loop_cache, max_fps=pi.max_fps)
+    def show_image(self, path):
+        # Промах кэша декодируется в пуле предзагрузки, не в GUI-потоке;
+        # слой обновится по image_ready
+        win = self.controller.video_win
+        w, h = self.rect.width(), self.rect.height()
+        key = win.image_cache.make_key(path, w, h, win.scale_mode)
+        if key is None:
+            return
+        frame = win.image_cache.get(key)
+        if frame is not None:
+            self.surface.set_layer(self.name, self.rect, frame)
+            return
+        self._image_key = key
+        win.prefetcher.prefetch([path], w, h, win.scale_mode)
+        future = win.prefetcher.pending(key)
+        if future is None:
+            # Успело попасть в кэш между проверками
+            frame = win.image_cache.get(key)
+            if frame is not None:
+                self.surface.set_layer(self.name, self.rect, frame)
+            return
+        future.add_done_callback(lambda f, key=key: self.image_ready.emit(key, f))
+    def on_image_ready(self, key, future):
+        if key != self._image_key or future.cancelled() or future.exception() is not None:
+            return
+        self._image_key = None
+        frame = future.result()
+        if frame is not None:
+            self.surface.set_layer(self.name, self.rect, frame)
+    def prefetch_next(self):
+        if not self.ord:
+            return
+        pi = self.controller.all_items[self.ord[(self.idx + 1) % len(self.ord)]]
+        if os.path.splitext(pi.path)[1].lower() in SUPPORTED_IMAGE_EXTS:
+            win = self.controller.video_win
+            win.prefetcher.prefetch([pi.path], self.rect.width(), self.rect.height(), win.scale_mode)
+    def on_frame_ready(self, output):
+        entry = self.worker.sinks[0].mailbox.take()
+        if entry is None:
+            return
+        token, frame = entry
+        if token == self.token:
+            self.surface.set_layer(self.name, self.rect, frame)
+        else:
+            release_frame(frame)
+    def on_video_finished(self, token, frames_shown):
+        if token != self.token:
+            return
+        pi = self.current
+        if pi is not None and frames_shown > 0:
+            # Повторы как в Controller.on_video_finished: loops == 0 — бесконечно
+            self.loop += 1
+            if pi.loops == 0 or self.loop < pi.loops:
+                self.play_current()
+                return
+        self.next_item()
     def stop(self):
-        print(f'[VideoThread] stop: stopping video {self.video_path}')
-        self._running = False
-        self.wait()
+        self.controller.scheduler.cancel(self.key)
+        self.worker.stop_current()
+        self.token = None
+        self.current = None
+        self._image_key = None
+        self.surface.clear_layer(self.name)
+    def shutdown(self):
+        self.stop()
+        self.worker.shutdown()
+    def stats(self):
+        sink = self.worker.sinks[0].stats()
+        paint_total, paints = self.surface.layer_paint_ms.get(self.name, (0.0, 0))
+        return {
+            'items': self.items_played,
+            'present_cpu_s': round(self.worker.present_cpu_total, 3),
+            'decode_cpu_s': round(self.worker.decode_cpu_total, 3),
+            'convert_ms_avg': round(sink['convert_ms_avg'], 3),
+            'paint_ms_avg': round(paint_total / paints, 3) if paints else 0.0,
+            'frames': sink['frames'],
+        }
 
 class MiniControllerWindow(QDialog):
     def __init__(self, controller):
@@ -416,14 +2350,17 @@ class MiniControllerWindow(QDialog):
             self.controller.save_settings()
 
 class Controller(QWidget):
+    paths_checked = pyqtSignal(object)
     def __init__(self, w=864, h=432):
         super().__init__()
         self.win_width = w
         self.win_height = h
+        self.scale_mode = SCALE_MODE
         self.last_folder = ''
         self.groups = []
         self.group_schedules = {}
         self.all_items = []
+        self.library = LibraryIndex()
         self.filter_groups = set()
         self.play_idx = -1
         self.ord = []
@@ -436,23 +2373,45 @@ class Controller(QWidget):
         self.filter_end_date = None
         self.main_window_geometry = None
         self.mini_ctrl_geometry = None
+        self.store = LibraryStore() if LIBRARY_STORE == 'sqlite' else None
+        self.settings_writer = SettingsWriter(SETTINGS_FILE, self.settings_snapshot, parent=self, store=self.store)
         self._log_file = "logs.txt"
         self._current_log = None
+        self.play_log = PlayLogWriter(self._log_file)
         self.video_win = VideoWindow(w, h)
         self.video_win.show()
+        self.outputs = [self.video_win]
+        self.extra_outputs = []  # геометрия дополнительных выходов: [x, y, w, h]
+        self.zones = []  # зоны экрана: {'name', 'rect': [x, y, w, h], 'groups': [...]}
+        self.zone_players = {}
         self.pending_interval_groups = []
         self._last_active_groups_filter = set()
         self._group_view_mode = None
         self.manual_skip = False
         self._interval_playing_groups = set()  # множество проигрываемых интервальных групп
         self.last_interval_run = {}
-        self.interval_check_timer = QTimer(self)
-        self.interval_check_timer.timeout.connect(self.check_interval_groups)
-        self.interval_check_timer.start(60_000)
-        self.video_thread = None
+        self._armed_intervals = {}  # группа -> интервал (мин), с которым взведён её таймер
+        self._last_active_groups = set()
+        self.scheduler = Scheduler(self)
+        self.loop_cache = ClipFrameCache()  # один бюджет LOOP_CACHE_BYTES на основной поток и все зоны
+        self.video_thread = VideoThread(w, h, loop_cache=self.loop_cache)
+        self.video_thread.frame_ready.connect(self.on_frame_ready)
+        self.video_thread.first_frame_shown.connect(self.on_first_frame_shown)
+        self.video_thread.video_finished.connect(self.on_video_finished)
+        self.video_thread.start()
+        QApplication.instance().aboutToQuit.connect(self.shutdown_playback)
+        QApplication.instance().aboutToQuit.connect(self.settings_writer.close)
+        QApplication.instance().aboutToQuit.connect(self.play_log.close)
+        self._video_token = None
+        self._video_completed = False
+        self._preroll = None
+        self._transition_from = None
+        self.transition_stats = {'count': 0, 'last_ms': 0.0, 'max_ms': 0.0, 'total_ms': 0.0}
+        self._startup_pending = True
+        self._library_ui_ready = False
+        self.paths_checked.connect(self.on_paths_checked)
         self.is_stopped = False
         self._just_manual = False
-        self.group_timers = {}
         self._interval_group_playing = set()  # <--- добавлено для отслеживания активных интервальных групп
         main_layout = QVBoxLayout(self)
         top_layout = QHBoxLayout()
@@ -484,6 +2443,12 @@ class Controller(QWidget):
         menu = QMenu(self)
         self.action_logs = menu.addAction('Открыть логи', self.show_logs)
         self.action_mini_ctrl = menu.addAction('Мини-контроллер', self.open_mini_controller)
+        self.action_add_output = menu.addAction('Добавить экран вывода', self.add_output_dialog)
+        self.action_clear_outputs = menu.addAction('Убрать дополнительные экраны', self.clear_extra_outputs)
+        self.action_add_zone = menu.addAction('Добавить зону', self.add_zone_dialog)
+        self.action_clear_zones = menu.addAction('Убрать зоны', self.clear_zones)
+        self.action_scale_mode = menu.addAction('Вписывать видео с полями', self.toggle_scale_mode)
+        self.action_scale_mode.setCheckable(True)
         self.action_reset = menu.addAction('Сбросить настройки', self.reset_settings)
         self.btn_more.setMenu(menu)
         top_layout.addWidget(self.btn_more)
@@ -493,8 +2458,9 @@ class Controller(QWidget):
         self.group_filter_list = QListWidget()
         self.group_filter_list.setMaximumWidth(300)
         splitter.addWidget(self.group_filter_list)
-        self.file_list = PlaylistListWidget(self, self)
-        self.file_list.setDragDropMode(QAbstractItemView.InternalMove)
+        self.playlist_model = PlaylistModel(self)
+        self.file_list = PlaylistView(self, self)
+        self.file_list.setModel(self.playlist_model)
         self.file_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.file_list.customContextMenuRequested.connect(self.file_context_menu)
         splitter.addWidget(self.file_list)
@@ -544,6 +2510,7 @@ class Controller(QWidget):
         font = QFont()
         font.setPointSize(11)
         self.setFont(font)
+        startup_timeline.mark('ui built')
         self.load_settings()
         self.btn_group_manager.clicked.connect(self.open_group_manager)
         self.btn_start.clicked.connect(self.start_playlist)
@@ -558,17 +2525,12 @@ class Controller(QWidget):
         self.timer = QTimer()
         self.timer.timeout.connect(self.next_frame)
         self.timer.setInterval(30)
-        self.timer2 = QTimer()
-        self.timer2.timeout.connect(self.on_duration_timeout)
-        self.timer2.setSingleShot(True)
-        self.timer3 = QTimer()
-        self.timer3.timeout.connect(self.next_file)
-        self.timer3.setSingleShot(True)
-        self.status_timer = QTimer()
-        self.status_timer.timeout.connect(self.update_status)
-        self.status_timer.start(1000)
         self.setMinimumSize(self.win_width + 36, self.win_height + 200)
         self.video_win.resize_window(self.win_width, self.win_height)
+        self.video_thread.set_target_size(self.win_width, self.win_height)
+        for geom in list(self.extra_outputs):
+            self.open_extra_output(*geom)
+        self.apply_scale_mode()
         if self.main_window_geometry is not None and is_valid_geometry(self.main_window_geometry):
             try:
                 geom = tuple(self.main_window_geometry)
@@ -581,17 +2543,24 @@ class Controller(QWidget):
                 self._mini_ctrl_win.setGeometry(*geom)
             except Exception:
                 pass
-        self.update_group_filter_list()
-        self.update_playlist_view()
-        self.save_settings()
         self.group_filter_list.itemClicked.connect(self.on_group_item_clicked)
+        # Сначала воспроизведение: списки библиотеки и проверка путей —
+        # после первого кадра (или по таймауту, если играть нечего)
         self.start_playlist()
+        startup_timeline.mark('playlist started')
+        if not self.ord:
+            self.end_startup_timeline('nothing to play')
+        QTimer.singleShot(STARTUP_UI_FALLBACK_MS, self.finish_startup)
 
     def open_group_manager(self):
         dlg = GroupManagerDialog(self, self.groups, self.group_schedules, self.update_group_filter_list)
         dlg.exec_()
         self.save_settings()
         self.update_group_filter_list()
+        # Расписания могли измениться — пересчитываем ближайшую границу
+        # и таймеры уже активных интервальных групп
+        self.on_schedule_boundary()
+        self.sync_interval_groups()
 
     def update_group_filter_list(self):
         self.group_filter_list.clear()
@@ -650,29 +2619,28 @@ class Controller(QWidget):
         except Exception:
             pass
         self.update_playlist_view()
+        self.update_status()
 
     def update_playlist_view(self):
-        self.file_list.clear()
+        # Видимые строки берутся из индекса групп; подписи модель
+        # форматирует только для строк, которые видны на экране
         if self._group_view_mode:
-            for pi in self.all_items:
-                if self._group_view_mode in pi.groups:
-                    self.add_list_item(pi)
-            return
-        for pi in self.all_items:
-            if not self.filter_groups:
-                if any(
-                    g in self.group_schedules and (
-                        self.group_schedules[g] and not getattr(self.group_schedules[g], 'is_interval_group', False)
-                    ) for g in pi.groups
-                ):
-                    self.add_list_item(pi)
-            else:
-                if any(
-                    g in self.filter_groups and g in self.group_schedules and (
-                        self.group_schedules[g] and not getattr(self.group_schedules[g], 'is_interval_group', False)
-                    ) for g in pi.groups
-                ):
-                    self.add_list_item(pi)
+            groups = [self._group_view_mode]
+        else:
+            groups = {g for g, sch in self.group_schedules.items() if sch and not getattr(sch, 'is_interval_group', False)}
+            if self.filter_groups:
+                groups &= self.filter_groups
+        self.playlist_model.set_rows([self.all_items[i] for i in self.library.indices(groups)])
+
+    def on_playlist_reordered(self, new_order):
+        # Перетаскивание меняет порядок видимых элементов; остальные идут следом
+        shown = {id(pi) for pi in new_order}
+        rest = [pi for pi in self.all_items if id(pi) not in shown]
+        self.all_items = new_order + rest
+        self.library.rebuild(self.all_items)
+        if self.store is not None:
+            self.store.reorder(self.all_items)
+        self.save_settings()
 
     def add_file_to_group(self):
         file_paths, _ = QFileDialog.getOpenFileNames(
@@ -690,17 +2658,21 @@ class Controller(QWidget):
         if not (ok and group):
             return
         added = 0
+        touched = []
         for file_path in file_paths:
-            pi = next((item for item in self.all_items if item.path == file_path), None)
+            pi = self.library.find(file_path)
             if not pi:
                 ext = os.path.splitext(file_path)[1].lower()
                 pi = PlaylistItem(file_path, None if ext in SUPPORTED_VIDEO_EXTS else 3000, 1)
-                self.all_items.append(pi)
+                self.add_library_item(pi)
             if group not in pi.groups:
                 pi.groups.add(group)
+                self.library.add(pi, group)
+                touched.append(pi)
                 added += 1
-            self.update_playlist_view()
-            self.save_settings()
+        self.persist_items(touched)
+        self.update_playlist_view()
+        self.save_settings()
         self.status_label.setText(f'Добавлено файлов в группу "{group}": {added}')
 
     def start_playlist(self):
@@ -710,13 +2682,13 @@ class Controller(QWidget):
             return
         print("[START_PLAYLIST] Запуск плейлиста")
         self._interval_playing_groups.clear()
-        for timer in self.group_timers.values():
-            timer.stop()
-        self.group_timers = {}
+        self.scheduler.clear()
         self.is_stopped = False
         self._group_view_mode = None
         self._interval_group_playing.clear()  # <--- очищаем активные интервальные группы при старте
-        now = datetime.now()
+        self.start_zones()
+        self._last_active_groups = self.active_schedule_groups()
+        self.arm_schedule_watch()
 
         # Формируем очередь из файлов основных групп
         now_active_groups = set()
@@ -730,7 +2702,7 @@ class Controller(QWidget):
                 play_groups = now_active_groups.intersection(self.filter_groups)
             else:
                 play_groups = now_active_groups
-            self.ord = [i for i, pi in enumerate(self.all_items) if pi.groups.intersection(play_groups)]
+            self.ord = self.library.indices(play_groups)
             print(f"[START_PLAYLIST] Активные группы: {play_groups}, ord: {self.ord}")
             if not self.ord:
                 self.status_label.setText("Нет элементов для выбранных групп.")
@@ -741,17 +2713,9 @@ class Controller(QWidget):
         for group_name, schedule in self.group_schedules.items():
             if schedule and schedule.is_interval_group and schedule.interval_minutes and schedule.is_active_now():
                 # Всегда обновляем время последнего запуска и перезапускаем таймер
-                self.last_interval_run[group_name] = now
                 print(f"[START_PLAYLIST] Перезапуск таймера интервальной группы {group_name}")
-                if group_name in self.group_timers:
-                    self.group_timers[group_name].stop()
-                    del self.group_timers[group_name]
-                timer = QTimer(self)
-                timer.setSingleShot(True)
-                timer.setInterval(schedule.interval_minutes * 60 * 1000)
-                timer.timeout.connect(partial(self.on_interval_group_trigger, group_name))
-                timer.start()
-                self.group_timers[group_name] = timer
+                self.arm_interval_group(group_name)
+        self.update_status()
 
         if self.ord:
             self.play_idx = -1
@@ -768,14 +2732,21 @@ class Controller(QWidget):
         # Защита: если группа уже играет, не запускать повторно
         if group_name in self._interval_group_playing or group_name in self._interval_playing_groups:
             print(f"[INTERVAL_TRIGGER] Группа {group_name} уже проигрывается, повторный запуск запрещён")
+            self.arm_interval_group(group_name)
+            return
+        schedule = self.group_schedules.get(group_name)
+        if schedule and not schedule.is_active_now():
+            # Вне расписания: таймер заново взведёт смена расписания
+            print(f"[INTERVAL_TRIGGER] Группа {group_name} не активна по расписанию")
+            self.last_interval_run.pop(group_name, None)
+            self.update_status()
             return
-        # Остановить и удалить таймер
-        if group_name in self.group_timers:
-            self.group_timers[group_name].stop()
-            del self.group_timers[group_name]
-        group_indices = [i for i, pi in enumerate(self.all_items) if group_name in pi.groups]
+        self.update_status()
+        group_indices = self.library.indices([group_name])
         if not group_indices:
             print(f"[INTERVAL_TRIGGER] Нет файлов в группе {group_name}")
+            # Файлы могут добавить позже — пробуем через интервал
+            self.arm_interval_group(group_name)
             return
         self._interval_playing_groups.add(group_name)
         self._interval_group_playing.add(group_name)
@@ -819,19 +2790,12 @@ class Controller(QWidget):
                 schedule = self.group_schedules.get(group_name)
                 if schedule and schedule.interval_minutes:
                     print(f"[NEXT_FILE] Перезапуск таймера для группы {group_name}")
-                    if group_name in self.group_timers:
-                        self.group_timers[group_name].stop()
-                        del self.group_timers[group_name]
-                    timer = QTimer(self)
-                    timer.setSingleShot(True)
-                    timer.setInterval(schedule.interval_minutes * 60 * 1000)
-                    timer.timeout.connect(partial(self.on_interval_group_trigger, group_name))
-                    timer.start()
-                    self.group_timers[group_name] = timer
-                    self.last_interval_run[group_name] = datetime.now()
+                    self.arm_interval_group(group_name)
                 self._interval_group_playing.discard(group_name)
                 finished_groups.add(group_name)
         self._interval_playing_groups -= finished_groups
+        if finished_groups:
+            self.update_status()
 
         if self.play_idx >= len(self.ord):
             if self.btn_repeat.isChecked():
@@ -844,7 +2808,7 @@ class Controller(QWidget):
                         play_groups = now_active_groups.intersection(self.filter_groups)
                     else:
                         play_groups = now_active_groups
-                    self.ord = [i for i, pi in enumerate(self.all_items) if pi.groups.intersection(play_groups)]
+                    self.ord = self.library.indices(play_groups)
                     if not self.ord:
                         self.status_label.setText("Нет файлов для активных групп.")
                         print("Нет файлов для активных групп.")
@@ -867,16 +2831,35 @@ class Controller(QWidget):
         self.log_start(pi)
         if ext in SUPPORTED_VIDEO_EXTS:
             self.start_video_thread(pi.path)
-            self.timer2.stop()
+            self.scheduler.cancel('item')
             if pi.duration:
-                self.timer2.start(pi.duration)
+                self.scheduler.schedule('item', pi.duration / 1000, self.on_duration_timeout)
         else:
             self.timer.stop()
-            self.timer2.stop()
             self.stop_video_thread()
-            self.video_win.show_image(pi.path)
+            self.show_image_on_outputs(pi.path)
             dur = pi.duration if pi.duration is not None else 3000
-            self.timer3.start(dur)
+            self.scheduler.schedule('item', dur / 1000, self.next_file)
+        self.prefetch_upcoming_images()
+        self.preroll_upcoming()
+
+    def prefetch_upcoming_images(self):
+        paths = []
+        n = len(self.ord)
+        for step in range(1, n + 1):
+            pos = self.play_idx + step
+            if pos >= n:
+                if not self.btn_repeat.isChecked():
+                    break
+                pos %= n
+            pi = self.all_items[self.ord[pos]]
+            if os.path.splitext(pi.path)[1].lower() in SUPPORTED_IMAGE_EXTS:
+                paths.append(pi.path)
+                if len(paths) >= IMAGE_PREFETCH_AHEAD:
+                    break
+        if paths:
+            for win in self.outputs:
+                win.prefetch_images(paths)
 
     def next_frame(self):
         if not self.cap:
@@ -899,7 +2882,13 @@ class Controller(QWidget):
                 return
         self.video_win.show_frame(frame)
 
+    def print_image_stats(self):
+        # Кэш и предзагрузка изображений общие для всех выходов
+        win = self.video_win
+        print(f'[Controller] images: cache {win.image_cache.stats()}, prefetch {win.prefetcher.stats()}')
+
     def on_duration_timeout(self):
+        self.print_image_stats()
         if self.cap:
             self.cap.release()
             self.cap = None
@@ -909,32 +2898,68 @@ class Controller(QWidget):
             return
         self.next_file()
 
-    def update_status(self):
+    def active_schedule_groups(self):
+        return {g for g, sch in self.group_schedules.items() if sch and sch.is_active_now()}
+
+    def arm_schedule_watch(self):
+        # Одно событие на ближайшую смену активности среди всех расписаний.
+        # Таймер идёт по monotonic, а границы заданы по настенным часам:
+        # дальние границы не ждём одним таймером, а сверяемся с часами
+        # каждые SCHEDULE_RECHECK_SECONDS — перевод часов не сдвинет смену групп
+        now = datetime.now()
+        changes = [c for c in (sch.next_change(now) for sch in self.group_schedules.values() if sch) if c]
+        if not changes:
+            self.scheduler.cancel('schedules')
+            return
+        delay = (min(changes) - now).total_seconds()
+        if delay > SCHEDULE_RECHECK_SECONDS:
+            self.scheduler.schedule('schedules', SCHEDULE_RECHECK_SECONDS, self.on_schedule_recheck)
+        else:
+            self.scheduler.schedule('schedules', delay, self.on_schedule_boundary)
+
+    def on_schedule_recheck(self):
+        # Часы могли перескочить границу: тогда обрабатываем её сразу
+        if not self.is_stopped and self.active_schedule_groups() != self._last_active_groups:
+            self.on_schedule_boundary()
+        else:
+            self.arm_schedule_watch()
+
+    def arm_interval_group(self, group_name):
+        schedule = self.group_schedules.get(group_name)
+        if not schedule or not schedule.interval_minutes:
+            return
+        self.last_interval_run[group_name] = datetime.now()
+        self._armed_intervals[group_name] = schedule.interval_minutes
+        self.scheduler.schedule(('interval', group_name), schedule.interval_minutes * 60,
+                                partial(self.on_interval_group_trigger, group_name))
+
+    def sync_interval_groups(self):
+        # После правки групп: таймер каждой активной интервальной группы
+        # должен идти с её текущим интервалом; лишние таймеры снимаются
         if self.is_stopped:
             return
-        now = datetime.now()
-        time_str = now.strftime("%H:%M:%S")
-        day_str = DAYS_OF_WEEK[now.weekday()]
-        active_groups = []
-        next_times = []
+        for group_name in list(self._armed_intervals):
+            schedule = self.group_schedules.get(group_name)
+            if not (schedule and getattr(schedule, 'is_interval_group', False) and schedule.interval_minutes and schedule.is_active_now()):
+                self.scheduler.cancel(('interval', group_name))
+                self._armed_intervals.pop(group_name, None)
         for group_name, schedule in self.group_schedules.items():
-            if schedule and schedule.is_active_now():
-                active_groups.append(group_name)
-            if schedule and schedule.interval_minutes and getattr(schedule, 'is_interval_group', False):
-                last_run = self.last_interval_run.get(group_name)
-                if last_run:
-                    ms_left = (last_run + timedelta(minutes=schedule.interval_minutes) - datetime.now()).total_seconds() * 1000
-                    if ms_left < 0:
-                        ms_left = 0
-                    min_left = int(ms_left // 60000)
-                    sec_left = int((ms_left // 1000) % 60)
-                    next_times.append(f"{group_name}: через {min_left} мин {sec_left} сек")
-                else:
-                    next_times.append(f"{group_name}: ожидание")
-        # --- Автоматическая перепроверка активных групп по времени ---
-        if not hasattr(self, '_last_active_groups'):
-            self._last_active_groups = set(active_groups)
-        new_groups = set(active_groups) - self._last_active_groups
+            if not (schedule and getattr(schedule, 'is_interval_group', False) and schedule.interval_minutes and schedule.is_active_now()):
+                continue
+            if group_name in self._interval_playing_groups:
+                # Доигрывает: таймер взведёт next_file по завершении группы
+                continue
+            if not self.scheduler.pending(('interval', group_name)) or self._armed_intervals.get(group_name) != schedule.interval_minutes:
+                print(f"[STATUS] Перезапуск таймера интервальной группы {group_name}: {schedule.interval_minutes} мин")
+                self.arm_interval_group(group_name)
+
+    def on_schedule_boundary(self):
+        if self.is_stopped:
+            return
+        active = self.active_schedule_groups()
+        new_groups = active - self._last_active_groups
+        gone_groups = self._last_active_groups - active
+        self._last_active_groups = active
         if new_groups:
             print(f"[STATUS] Новые активные группы: {new_groups}")
             # Обычные группы (не интервальные)
@@ -945,29 +2970,48 @@ class Controller(QWidget):
                     self.start_playlist()
                 else:
                     for g in new_main_groups:
-                        indices = [i for i, pi in enumerate(self.all_items) if g in pi.groups]
+                        indices = self.library.indices([g])
                         self.ord.extend(indices)
                     print(f"[STATUS] Добавлены файлы групп {new_main_groups} в конец очереди")
             # Интервальные группы: если активна и таймер не запущен — запустить таймер
             new_interval_groups = {g for g in new_groups if getattr(self.group_schedules.get(g), 'is_interval_group', False)}
             for g in new_interval_groups:
-                if g not in self.group_timers:
-                    schedule = self.group_schedules.get(g)
-                    if schedule and schedule.interval_minutes:
-                        print(f"[STATUS] Запускаю таймер интервальной группы {g}")
-                        timer = QTimer(self)
-                        timer.setSingleShot(True)
-                        timer.setInterval(schedule.interval_minutes * 60 * 1000)
-                        timer.timeout.connect(lambda g=g: self.on_interval_group_trigger(g))
-                        timer.start()
-                        self.group_timers[g] = timer
-                        self.last_interval_run[g] = datetime.now()
-        self._last_active_groups = set(active_groups)
+                if not self.scheduler.pending(('interval', g)):
+                    print(f"[STATUS] Запускаю таймер интервальной группы {g}")
+                    self.arm_interval_group(g)
+        for g in gone_groups:
+            if getattr(self.group_schedules.get(g), 'is_interval_group', False):
+                self.scheduler.cancel(('interval', g))
+                self.last_interval_run.pop(g, None)
+        for zone in self.zone_players.values():
+            if not zone.ord:
+                zone.start()
+        self.arm_schedule_watch()
+        self.update_status()
+
+    def update_status(self):
+        # Строка состояния пересобирается только при событиях, а не по таймеру
+        if self.is_stopped:
+            return
+        now = datetime.now()
+        day_str = DAYS_OF_WEEK[now.weekday()]
+        active_groups = []
+        next_times = []
+        for group_name, schedule in self.group_schedules.items():
+            if schedule and schedule.is_active_now():
+                active_groups.append(group_name)
+            if schedule and schedule.interval_minutes and getattr(schedule, 'is_interval_group', False):
+                left = self.scheduler.remaining(('interval', group_name))
+                if left is not None:
+                    at = now + timedelta(seconds=left)
+                    next_times.append(f"{group_name}: в {at.strftime('%H:%M:%S')}")
+                else:
+                    next_times.append(f"{group_name}: ожидание")
         if self.filter_groups:
             shown_groups = [g for g in active_groups if g in self.filter_groups]
         else:
             shown_groups = active_groups
-        status_lines = [f"Время: {time_str}, {day_str}"]
+        status_lines = [f"{day_str}, обновлено в {now.strftime('%H:%M')}"]
         if shown_groups:
             status_lines.append(f"Активные группы: {', '.join(shown_groups)}")
         else:
@@ -1008,13 +3052,14 @@ class Controller(QWidget):
             block(False)
 
     def file_context_menu(self, pos):
-        li = self.file_list.itemAt(pos)
-        if not li:
+        index = self.file_list.indexAt(pos)
+        if not index.isValid():
             return
-        self.file_list.setCurrentItem(li)
-        pi = li.data(Qt.ItemDataRole.UserRole)
+        self.file_list.setCurrentIndex(index)
+        pi = self.playlist_model.item(index.row())
+        li = None
         m = QMenu(self)
-        m.addAction("Установить длительность и loops", lambda: self.edit_dur_loops(li))
+        m.addAction("Установить длительность и loops", lambda: self.edit_dur_loops(pi))
         mg = m.addMenu("Добавить в группу")
         if mg is not None and hasattr(mg, 'addAction'):
             mg.addAction("Все", lambda: self.assign_all_groups(pi, li))
@@ -1033,24 +3078,35 @@ class Controller(QWidget):
                     pass
 
     def assign_all_groups(self, pi, li=None):
+        for g in pi.groups:
+            self.library.discard(pi, g)
         pi.groups.clear()
+        self.persist_items([pi])
         self.status_label.setText('Файл удалён из всех групп.')
         self.update_playlist_view()
+        self.playlist_model.refresh_item(pi)
 
     def assign_group(self, pi, group, li=None):
         if group in pi.groups:
             pi.groups.remove(group)
+            self.library.discard(pi, group)
             self.status_label.setText(f'Группа "{group}" удалена из файла.')
         else:
             pi.groups.add(group)
+            self.library.add(pi, group)
             self.status_label.setText(f'Группа "{group}" добавлена к файлу.')
+        self.persist_items([pi])
         self.update_playlist_view()
+        self.playlist_model.refresh_item(pi)
 
     def remove_group_from_file(self, pi, group, li=None):
         if group in pi.groups:
             pi.groups.remove(group)
+            self.library.discard(pi, group)
+            self.persist_items([pi])
             self.status_label.setText(f'Файл удалён из группы "{group}".')
             self.update_playlist_view()
+            self.playlist_model.refresh_item(pi)
             self.save_settings()
 
     def change_player_size(self):
@@ -1064,8 +3120,122 @@ class Controller(QWidget):
         self.win_height = h
         self.setMinimumSize(w + 36, h + 200)
         self.video_win.resize_window(w, h)
+        if self.video_thread:
+            self.video_thread.set_target_size(w, h)
         self.status_label.setText(f"Размер плеера изменён: {w}x{h}")
 
+    def open_extra_output(self, x, y, w, h):
+        x, y, w, h = int(x), int(y), int(w), int(h)
+        win = VideoWindow(w, h, image_cache=self.video_win.image_cache, prefetcher=self.video_win.prefetcher,
+                          pos=(x, y), primary=False)
+        win.resize_window(w, h)
+        win.set_scale_mode(self.scale_mode)
+        win.show()
+        self.outputs.append(win)
+        self.video_thread.add_output(w, h, self.scale_mode)
+        print(f'[Controller] output {len(self.outputs) - 1}: {w}x{h} at ({x}, {y})')
+
+    def add_output_dialog(self):
+        values = []
+        prompts = [("X", "Позиция X:", 0, -10000, 10000), ("Y", "Позиция Y:", 0, -10000, 10000),
+                   ("Ширина", "Ширина:", self.win_width, 100, 3840), ("Высота", "Высота:", self.win_height, 100, 2160)]
+        for title, label, value, lo, hi in prompts:
+            v, ok = QInputDialog.getInt(self, title, label, value=value, min=lo, max=hi)
+            if not ok:
+                return
+            values.append(v)
+        self.extra_outputs.append(values)
+        self.open_extra_output(*values)
+        self.save_settings()
+        self.status_label.setText(f"Добавлен экран вывода: {values[2]}x{values[3]}")
+
+    def clear_extra_outputs(self):
+        self.video_thread.remove_extra_outputs()
+        for win in self.outputs[1:]:
+            win.close()
+        self.outputs = self.outputs[:1]
+        self.extra_outputs = []
+        self.save_settings()
+        self.status_label.setText("Дополнительные экраны убраны.")
+
+    def zone_player(self, zone):
+        player = self.zone_players.get(zone['name'])
+        if player is None:
+            player = ZonePlayer(self, zone['name'], zone['rect'], zone.get('groups', []))
+            self.zone_players[zone['name']] = player
+        return player
+
+    def start_zones(self):
+        for zone in self.zones:
+            self.zone_player(zone).start()
+
+    def stop_zones(self):
+        for name, player in self.zone_players.items():
+            player.stop()
+            print(f'[ZONE {name}] статистика: {player.stats()}')
+
+    def add_zone_dialog(self):
+        if not self.groups:
+            QMessageBox.information(self, "Зоны", "Сначала создайте группу файлов для зоны.")
+            return
+        name, ok = QInputDialog.getText(self, "Зона", "Название зоны:")
+        name = name.strip()
+        if not ok or not name or any(z['name'] == name for z in self.zones):
+            return
+        group, ok = QInputDialog.getItem(self, "Зона", "Группа файлов:", self.groups, 0, False)
+        if not ok:
+            return
+        values = []
+        prompts = [("X", "Позиция X в окне:", 0, 0, self.win_width - 16), ("Y", "Позиция Y в окне:", 0, 0, self.win_height - 16),
+                   ("Ширина", "Ширина:", self.win_width // 4, 16, self.win_width), ("Высота", "Высота:", self.win_height // 4, 16, self.win_height)]
+        for title, label, value, lo, hi in prompts:
+            v, ok = QInputDialog.getInt(self, title, label, value=value, min=lo, max=hi)
+            if not ok:
+                return
+            values.append(v)
+        zone = {'name': name, 'rect': values, 'groups': [group]}
+        self.zones.append(zone)
+        if not self.is_stopped:
+            self.zone_player(zone).start()
+        self.save_settings()
+        self.status_label.setText(f"Добавлена зона «{name}»: {values[2]}x{values[3]}")
+
+    def clear_zones(self):
+        for player in self.zone_players.values():
+            player.shutdown()
+        self.zone_players = {}
+        self.zones = []
+        self.save_settings()
+        self.status_label.setText("Зоны убраны.")
+
+    def show_image_on_outputs(self, path):
+        missing = [win for win in self.outputs if not win.try_show_cached(path)]
+        shown = len(missing) < len(self.outputs)
+        if len(missing) == 1:
+            shown = missing[0].show_image(path) or shown
+        elif missing:
+            # Один декод на все выходы, масштабирование — под каждый
+            img = cv2.imread(path)
+            if img is not None:
+                for win in missing:
+                    win.show_decoded_image(path, img)
+                shown = True
+        if shown and self._startup_pending:
+            self.on_startup_frame()
+
+    def apply_scale_mode(self):
+        for win in self.outputs:
+            win.set_scale_mode(self.scale_mode)
+        self.video_thread.set_scale_mode(self.scale_mode)
+        self.action_scale_mode.setChecked(self.scale_mode == SCALE_LETTERBOX)
+
+    def toggle_scale_mode(self):
+        self.scale_mode = SCALE_STRETCH if self.scale_mode == SCALE_LETTERBOX else SCALE_LETTERBOX
+        self.apply_scale_mode()
+        self.save_settings()
+        mode = "вписать с полями" if self.scale_mode == SCALE_LETTERBOX else "растянуть"
+        self.status_label.setText(f"Режим масштабирования: {mode}")
+
     def log_start(self, pi):
         self._current_log = {
             'file': os.path.basename(pi.path),
@@ -1080,9 +3250,8 @@ class Controller(QWidget):
         start = self._current_log['start']
         end = self._current_log['end']
         duration = (end - start).total_seconds()
-        with open(self._log_file, 'a', encoding='utf-8') as f:
-            f.write(f"{self._current_log['file']} | {self._current_log['groups']} | "
-                    f"{start.strftime('%Y-%m-%d %H:%M:%S')} | {end.strftime('%Y-%m-%d %H:%M:%S')} | {duration:.2f} сек\n")
+        self.play_log.write(f"{self._current_log['file']} | {self._current_log['groups']} | "
+                            f"{start.strftime('%Y-%m-%d %H:%M:%S')} | {end.strftime('%Y-%m-%d %H:%M:%S')} | {duration:.2f} сек\n")
         self._current_log = None
 
     def show_logs(self):
@@ -1131,12 +3300,8 @@ class Controller(QWidget):
         header = table.horizontalHeader()
         if header is not None and hasattr(header, 'setSectionResizeMode'):
             header.setSectionResizeMode(QHeaderView.Stretch)
-        try:
-            with open(self._log_file, 'r', encoding='utf-8') as f:
-                lines = [line.strip() for line in f if line.strip()]
-        except Exception:
-            lines = []
-        def parse_lines():
+        loaded = {}  # период -> строки таблицы; архивы читаются только под выбранные даты
+        def parse_lines(lines):
             data = []
             for line in lines:
                 parts = [p.strip() for p in line.split('|')]
@@ -1149,12 +3314,19 @@ class Controller(QWidget):
                     pass
                 data.append(parts)
             return data
-        all_data = parse_lines()
+        def load_data(start_val, end_val):
+            period = (start_val.toPyDate() if start_val > QDate(1970, 1, 1) else None,
+                      end_val.toPyDate() if end_val < QDate(2100, 12, 31) else None)
+            if period not in loaded:
+                loaded.clear()
+                loaded[period] = parse_lines(self.play_log.read_lines(*period))
+            return loaded[period]
         def apply_filter():
             file_text = filter_file.text().lower()
             group_text = filter_group.text().lower()
             start_val = start_date.date()
             end_val = end_date.date()
+            all_data = load_data(start_val, end_val)
             filtered = []
             for row in all_data:
                 if file_text and file_text not in row[0].lower():
@@ -1234,11 +3406,8 @@ class Controller(QWidget):
         def clear_logs():
             import os
             try:
-                with open(self._log_file, 'w', encoding='utf-8') as f:
-                    pass
-                nonlocal lines, all_data
-                lines = []
-                all_data = []
+                self.play_log.truncate()
+                loaded.clear()
                 apply_filter()
             except Exception as e:
                 QMessageBox.warning(dlg, 'Ошибка', f'Не удалось очистить логи: {e}')
@@ -1249,10 +3418,17 @@ class Controller(QWidget):
         self.save_settings()
 
     def save_settings(self):
+        self.settings_writer.request()
+
+    def settings_snapshot(self):
+        # Копии изменяемых списков: сериализация идёт в другом потоке
         data = {
             'win_width': self.win_width,
             'win_height': self.win_height,
-            'groups': self.groups,
+            'scale_mode': self.scale_mode,
+            'extra_outputs': [list(g) for g in self.extra_outputs],
+            'zones': [dict(z) for z in self.zones],
+            'groups': list(self.groups),
             'group_schedules': {g: self.serialize_schedule(s) for g, s in self.group_schedules.items()},
             'last_folder': self.last_folder,
             'filter_file_text': self.filter_file_text,
@@ -1260,25 +3436,47 @@ class Controller(QWidget):
             'filter_start_date': self.filter_start_date,
             'filter_end_date': self.filter_end_date,
             'main_window_geometry': list(self.geometry().getRect()),
-            'files': [self.serialize_item(pi) for pi in self.all_items],
             'last_interval_run': {k: v.isoformat() for k, v in self.last_interval_run.items()},
             'mini_ctrl_geometry': list(self._mini_ctrl_win.geometry().getRect()) if self._mini_ctrl_win and self._mini_ctrl_win.isVisible() else None,
         }
-        try:
-            with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print('Ошибка сохранения настроек:', e)
+        if self.store is None:
+            # С базой элементы сохраняются по одному через persist_items
+            data['files'] = [self.serialize_item(pi) for pi in self.all_items]
+        return data
+
+    def read_settings_data(self):
+        if self.store is not None:
+            if self.store.is_empty():
+                if not os.path.exists(SETTINGS_FILE):
+                    return None
+                # Первый запуск с базой: переносим библиотеку из settings.json
+                with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
+                    self.store.import_data(json.load(f))
+                print(f'[LOAD_SETTINGS] Настройки перенесены в {self.store.path}')
+            return self.store.load()
+        if not os.path.exists(SETTINGS_FILE):
+            return None
+        with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def persist_items(self, items):
+        # С базой изменённые элементы пишутся сразу и только они
+        if self.store is not None:
+            self.store.save_items([(self.library.position(pi), pi) for pi in items])
 
     def load_settings(self):
-        if not os.path.exists(SETTINGS_FILE):
-            self.save_settings()
-            return
         try:
-            with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = self.read_settings_data()
+            startup_timeline.mark('settings parsed')
+            if data is None:
+                self.save_settings()
+                return
             self.win_width = data.get('win_width', self.win_width)
             self.win_height = data.get('win_height', self.win_height)
+            if data.get('scale_mode') in (SCALE_STRETCH, SCALE_LETTERBOX):
+                self.scale_mode = data['scale_mode']
+            self.extra_outputs = [g for g in data.get('extra_outputs', []) if is_valid_geometry(g)]
+            self.zones = [z for z in data.get('zones', []) if isinstance(z, dict) and z.get('name') and is_valid_geometry(z.get('rect'))]
             self.groups = data.get('groups', [])
             self.group_schedules = {g: self.deserialize_schedule(s) for g, s in data.get('group_schedules', {}).items()}
             self.last_folder = data.get('last_folder', '')
@@ -1287,15 +3485,13 @@ class Controller(QWidget):
             self.filter_start_date = data.get('filter_start_date')
             self.filter_end_date = data.get('filter_end_date')
             self.main_window_geometry = data.get('main_window_geometry')
+            # Существование файлов проверяется в фоне после старта (check_library_paths)
             self.all_items = [self.deserialize_item(d) for d in data.get('files', [])]
-            self.all_items = [pi for pi in self.all_items if os.path.exists(pi.path)]
+            self.library.rebuild(self.all_items)
             from datetime import datetime
             self.last_interval_run = {k: datetime.fromisoformat(v) for k, v in data.get('last_interval_run', {}).items()}
             today = date.today()
             self.last_interval_run = {k: v for k, v in self.last_interval_run.items() if v.date() == today}
-            self.interval_check_timer.start(60_000)
-            self.update_playlist_view()
-            self.update_group_filter_list()
             for group_name, schedule in self.group_schedules.items():
                 if schedule and schedule.is_interval_group and schedule.interval_minutes:
                     if schedule.is_active_now():
@@ -1315,9 +3511,14 @@ class Controller(QWidget):
 
     def reset_settings(self):
         import sys, os, subprocess
-        if os.path.exists(SETTINGS_FILE):
+        self.settings_writer.cancel()
+        if self.store is not None:
+            self.store.close()
+        for path in (SETTINGS_FILE, LIBRARY_DB_FILE, LIBRARY_DB_FILE + '-wal', LIBRARY_DB_FILE + '-shm'):
+            if not os.path.exists(path):
+                continue
             try:
-                os.remove(SETTINGS_FILE)
+                os.remove(path)
             except Exception as e:
                 print('Ошибка удаления настроек:', e)
         python = sys.executable
@@ -1365,11 +3566,16 @@ class Controller(QWidget):
             'path': pi.path,
             'duration': pi.duration,
             'loops': pi.loops,
+            'max_fps': pi.max_fps,
             'groups': list(pi.groups)
         }
 
+    def add_library_item(self, pi):
+        self.all_items.append(pi)
+        self.library.append(len(self.all_items) - 1, pi)
+
     def deserialize_item(self, d):
-        pi = PlaylistItem(d['path'], d.get('duration'), d.get('loops', 1))
+        pi = PlaylistItem(d['path'], d.get('duration'), d.get('loops', 1), d.get('max_fps'))
         pi.groups = set(d.get('groups', []))
         return pi
 
@@ -1379,24 +3585,24 @@ class Controller(QWidget):
             self.status_label.setText("Выбор папки отменён.")
             return
         self.last_folder = folder
-        added = 0
+        added = []
         for f in sorted(os.listdir(folder)):
             ext = os.path.splitext(f)[1].lower()
             if ext in SUPPORTED_EXTS:
                 path = os.path.join(folder, f)
-                if not any(pi.path == path for pi in self.all_items):
+                if self.library.find(path) is None:
                     pi = PlaylistItem(path, None if ext in SUPPORTED_VIDEO_EXTS else 3000, 1)
-                    self.all_items.append(pi)
-                    added += 1
+                    self.add_library_item(pi)
+                    added.append(pi)
+        self.persist_items(added)
         self.update_playlist_view()
         self.save_settings()
         if added:
-            self.status_label.setText(f"Добавлено файлов: {added}")
+            self.status_label.setText(f"Добавлено файлов: {len(added)}")
         else:
             self.status_label.setText("Все файлы из папки уже добавлены.")
 
-    def edit_dur_loops(self, li):
-        pi = li.data(Qt.ItemDataRole.UserRole)
+    def edit_dur_loops(self, pi):
         dur_sec, ok1 = QInputDialog.getInt(
             self, "Длительность (сек)", "Введите длительность в секундах (0 = авто):",
             value=int(pi.duration / 1000) if pi.duration is not None else 0, min=0, max=3600*10
@@ -1409,9 +3615,19 @@ class Controller(QWidget):
         )
         if not ok2:
             return
+        max_fps = pi.max_fps or 0
+        if os.path.splitext(pi.path)[1].lower() in SUPPORTED_VIDEO_EXTS:
+            max_fps, ok3 = QInputDialog.getInt(
+                self, "Макс. FPS", "Ограничение частоты кадров (0 = без ограничения):",
+                value=pi.max_fps or 0, min=0, max=240
+            )
+            if not ok3:
+                return
         pi.duration = dur_sec * 1000 if dur_sec > 0 else None
         pi.loops = loops
-        self.update_playlist_view()
+        pi.max_fps = max_fps or None
+        self.persist_items([pi])
+        self.playlist_model.refresh_item(pi)
         self.save_settings()
         self.status_label.setText(f'Длительность и повторы обновлены: {dur_sec} сек, loops={loops}')
 
@@ -1423,44 +3639,195 @@ class Controller(QWidget):
             self._group_view_mode = group_name
         self.update_playlist_view()
 
-    def check_interval_groups(self):
-        if self.is_stopped:
-            print("[CHECK_INTERVAL] Воспроизведение остановлено")
-            return
-        now = datetime.now()
-        for group_name, schedule in self.group_schedules.items():
-            if not schedule or not schedule.is_interval_group or not schedule.interval_minutes:
-                continue
-            if not schedule.is_active_now():
-                if group_name in self.last_interval_run:
-                    del self.last_interval_run[group_name]
-                print(f"[CHECK_INTERVAL] Группа {group_name} не активна по расписанию")
-                continue
-            last_run = self.last_interval_run.get(group_name)
-            time_elapsed = (now - last_run).total_seconds() if last_run else float('inf')
-            print(f"[CHECK_INTERVAL] Группа {group_name}, last_run: {last_run}, time_elapsed: {time_elapsed}, interval: {schedule.interval_minutes * 60}")
-            if not last_run or time_elapsed >= schedule.interval_minutes * 60:
-                self.last_interval_run[group_name] = now
-                self.on_interval_group_trigger(group_name)
-
     def start_video_thread(self, video_path):
         print(f'[Controller] start_video_thread: {video_path}')
-        if self.video_thread:
-            self.video_thread.stop()
-        self.video_thread = VideoThread(video_path, self.win_width, self.win_height)
-        self.video_thread.frame_ready.connect(self.video_win.show_frame)
-        self.video_thread.video_finished.connect(self.on_video_finished)
-        self.video_thread.start()
+        worker = self.video_thread
+        start_at = None
+        self._transition_from = monotonic()
+        if self._video_completed and worker.last_frame_time is not None:
+            # Предыдущий ролик доигран: стыкуем по его границе кадра
+            start_at = worker.next_deadline
+            self._transition_from = worker.last_frame_time + worker.interval
+        self._video_completed = False
+        self.manual_skip = False
+        source = self.take_preroll(video_path)
+        pi = self._current_playing
+        loop_cache = LOOP_CACHE_ENABLED and pi is not None and pi.path == video_path and pi.loops != 1
+        max_fps = pi.max_fps if pi is not None and pi.path == video_path else None
+        self._video_token = worker.play(video_path, source=source, start_at=start_at, loop_cache=loop_cache, max_fps=max_fps)
+        self.preroll_upcoming()
 
     def stop_video_thread(self):
         print(f'[Controller] stop_video_thread')
-        if self.video_thread:
-            self.video_thread.stop()
-            self.video_thread = None
+        if self._video_token is not None:
+            self.video_thread.stop_current()
+            self._video_token = None
+        self._video_completed = False
+
+    def shutdown_playback(self):
+        self.video_thread.retire(self._preroll)
+        self._preroll = None
+        for zone in self.zone_players.values():
+            zone.shutdown()
+        self.zone_players = {}
+        self.video_thread.shutdown()
+
+    def upcoming_item(self):
+        pi = self._current_playing
+        if pi and pi.duration is None and (pi.loops == 0 or pi._current_loop + 1 < pi.loops):
+            if os.path.splitext(pi.path)[1].lower() in SUPPORTED_VIDEO_EXTS:
+                # Следующий цикл того же ролика: поток перемотает открытый контейнер
+                return None
+        if not self.ord:
+            return None
+        pos = self.play_idx + 1
+        if pos >= len(self.ord):
+            if not self.btn_repeat.isChecked():
+                return None
+            pos = 0
+        return self.all_items[self.ord[pos]]
+
+    def upcoming_video_item(self):
+        pi = self.upcoming_item()
+        if pi is not None and os.path.splitext(pi.path)[1].lower() in SUPPORTED_VIDEO_EXTS:
+            return pi
+        return None
+
+    def preroll_upcoming(self):
+        # Следующий ролик открывается и декодирует первые кадры, пока играет текущий
+        pi = self.upcoming_video_item()
+        path = pi.path if pi is not None else None
+        if self._preroll is not None and self._preroll.path != path:
+            self.video_thread.retire(self._preroll)
+            self._preroll = None
+        if path and self._preroll is None:
+            print(f'[Controller] preroll: {path}')
+            self._preroll = open_video_source(path, max_fps=pi.max_fps or self.video_thread.max_fps)
+
+    def take_preroll(self, video_path):
+        # Чужой preroll (например, следующий элемент при повторе текущего
+        # ролика) остаётся ждать своей очереди
+        if self._preroll is None or self._preroll.path != video_path:
+            return None
+        source, self._preroll = self._preroll, None
+        return source
+
+    def on_frame_ready(self, output):
+        sinks = self.video_thread.sinks
+        if output >= len(sinks):
+            return
+        entry = sinks[output].mailbox.take()
+        if entry is None:
+            return
+        token, frame = entry
+        if token == self._video_token and output < len(self.outputs):
+            self.outputs[output].show_frame(frame)
+            if self._startup_pending:
+                self.on_startup_frame()
+        else:
+            release_frame(frame)
 
-    def on_video_finished(self):
+    def on_startup_frame(self):
+        self.end_startup_timeline('first frame')
+        QTimer.singleShot(0, self.finish_startup)
+
+    def end_startup_timeline(self, mark):
+        # Таймлайн закрывается первым кадром или когда ясно, что кадра не будет;
+        # достройка интерфейса по таймауту его не закрывает
+        if not self._startup_pending:
+            return
+        self._startup_pending = False
+        startup_timeline.mark(mark)
+        startup_timeline.report()
+
+    def finish_startup(self):
+        if self._library_ui_ready:
+            return
+        self._library_ui_ready = True
+        t0 = perf_counter()
+        self.update_group_filter_list()
+        self.update_playlist_view()
+        print(f'[STARTUP] library UI built in {(perf_counter() - t0) * 1000:.0f} ms')
+        startup_timeline.mark('library UI')
+        self.check_library_paths()
+
+    def check_library_paths(self):
+        # Проверка путей параллельно и вне GUI-потока: на сетевых дисках
+        # os.path.exists может стоить десятки миллисекунд на файл
+        items = list(self.all_items)
+        def run():
+            t0 = perf_counter()
+            with ThreadPoolExecutor(max_workers=PATH_CHECK_WORKERS, thread_name_prefix='pathcheck') as pool:
+                exists = list(pool.map(os.path.exists, [pi.path for pi in items]))
+            missing = [pi for pi, ok in zip(items, exists) if not ok]
+            print(f'[STARTUP] library paths checked: {len(items)} files, {len(missing)} missing, '
+                  f'{(perf_counter() - t0) * 1000:.0f} ms')
+            self.paths_checked.emit(missing)
+        threading.Thread(target=run, daemon=True, name='pathcheck').start()
+
+    def on_paths_checked(self, missing):
+        if missing:
+            self.prune_items(missing)
+
+    def prune_items(self, removed):
+        # Убирает элементы из библиотеки, пересчитывая номера в очередях
+        removed_ids = {id(pi) for pi in removed}
+        new_index = {}
+        kept = []
+        for i, pi in enumerate(self.all_items):
+            if id(pi) not in removed_ids:
+                new_index[i] = len(kept)
+                kept.append(pi)
+        if len(kept) == len(self.all_items):
+            return
+        self.ord, self.play_idx = self.remap_queue(self.ord, self.play_idx, new_index)
+        for zone in self.zone_players.values():
+            zone.ord, zone.idx = self.remap_queue(zone.ord, zone.idx, new_index)
+        self.all_items = kept
+        self.library.rebuild(self.all_items)
+        if self.store is not None:
+            self.store.delete_items([pi.path for pi in removed])
+            self.store.reorder(self.all_items)
+        self.update_playlist_view()
+        self.save_settings()
+        print(f'[Controller] removed {len(removed)} missing files from the library')
+
+    def remap_queue(self, order, pos, new_index):
+        # Позиция сдвигается на число удалённых элементов до неё включительно
+        remapped = []
+        new_pos = -1
+        for j, i in enumerate(order):
+            if i in new_index:
+                remapped.append(new_index[i])
+            if j == pos:
+                new_pos = len(remapped) - 1
+        return remapped, new_pos
+
+    def on_first_frame_shown(self, token, shown_at):
+        if token != self._video_token or self._transition_from is None:
+            return
+        gap_ms = max(0.0, (shown_at - self._transition_from) * 1000)
+        self._transition_from = None
+        st = self.transition_stats
+        st['count'] += 1
+        st['last_ms'] = gap_ms
+        st['max_ms'] = max(st['max_ms'], gap_ms)
+        st['total_ms'] += gap_ms
+        print(f"[Controller] transition gap: {gap_ms:.1f} ms (frame {self.video_thread.interval * 1000:.1f} ms, "
+              f"max {st['max_ms']:.1f} ms, avg {st['total_ms'] / st['count']:.1f} ms)")
+
+    def on_video_finished(self, token, frames_shown):
         print(f'[Controller] on_video_finished')
-        if self.video_thread and getattr(self.video_thread, 'frames_shown', 0) == 0:
+        if token != self._video_token:
+            print('[Controller] on_video_finished: stale command, ignored')
+            return
+        self._video_completed = frames_shown > 0
+        sinks = self.video_thread.sinks
+        for i, win in enumerate(self.outputs):
+            sink_stats = sinks[i].stats() if i < len(sinks) else None
+            print(f'[Controller] output {i}: render {win.render_stats()}, sink {sink_stats}')
+        self.print_image_stats()
+        if frames_shown == 0:
             print('[Controller] on_video_finished: no frames shown, skipping repeat')
             if self._current_playing:
                 self._current_playing._current_loop = 0
@@ -1486,7 +3853,7 @@ class Controller(QWidget):
 
     def play_group_playlist(self, group_name):
         print(f"[PLAY_GROUP_PLAYLIST] Запуск группы {group_name}")
-        group_indices = [i for i, pi in enumerate(self.all_items) if group_name in pi.groups]
+        group_indices = self.library.indices([group_name])
         if not group_indices:
             print(f"[PLAY_GROUP_PLAYLIST] Нет файлов для группы {group_name}")
             self.status_label.setText(f"Нет файлов для интервальной группы {group_name}.")
@@ -1519,9 +3886,10 @@ class Controller(QWidget):
             self.log_end(self._current_playing)
         print("[STOP_PLAYLIST] Остановка плейлиста")
         self.timer.stop()
-        self.timer2.stop()
-        self.timer3.stop()
         self.stop_video_thread()
+        self.video_thread.retire(self._preroll)
+        self._preroll = None
+        self.stop_zones()
         self.status_label.setText("Воспроизведение остановлено.")
         self.play_idx = -1
         self._current_playing = None
@@ -1529,26 +3897,19 @@ class Controller(QWidget):
         self.pending_interval_groups.clear()
         self.last_interval_run.clear()
         self._interval_group_playing.clear()  # <--- очищаем активные интервальные группы при остановке
-        for timer in self.group_timers.values():
-            timer.stop()
-        self.group_timers.clear()
-        self.interval_check_timer.stop()
+        print(f"[STOP_PLAYLIST] Планировщик: {self.scheduler.stats()}")
+        self.scheduler.clear()
         self.is_stopped = True
         self.ord = []
-
-    def add_list_item(self, pi):
-        txt = self.build_label(pi)
-        li = QListWidgetItem(txt)
-        li.setData(Qt.ItemDataRole.UserRole, pi)
-        li.setToolTip('ПКМ — назначить группу, изменить длительность и повторы')
-        self.file_list.addItem(li)
+        self.end_startup_timeline('stopped')
 
     def build_label(self, pi):
         fn = os.path.basename(pi.path)
         dur = f"{pi.duration / 1000:.1f}с" if pi.duration else "видео"
         loops = "∞" if pi.loops == 0 else str(pi.loops)
         gs = ", ".join(pi.groups) or "-"
-        return f"{fn} [{dur}, loops={loops}, groups={gs}]"
+        fps = f", fps≤{pi.max_fps}" if pi.max_fps else ""
+        return f"{fn} [{dur}, loops={loops}{fps}, groups={gs}]"
 
     def shuffle_playlist(self):
         import random
@@ -1568,27 +3929,90 @@ class Controller(QWidget):
     def toggle_repeat(self):
         self.status_label.setText("Режим повтора переключён.")
 
-class PlaylistListWidget(QListWidget):
+class PlaylistModel(QAbstractListModel):
+    # Ленивая модель плейлиста: хранит только список видимых элементов,
+    # подпись строки строится в data() по запросу представления
+    TOOLTIP = 'ПКМ — назначить группу, изменить длительность и повторы'
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.controller = controller
+        self._rows = []
+        self._row_of = {}
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        pi = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.controller.build_label(pi)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self.TOOLTIP
+        if role == Qt.ItemDataRole.UserRole:
+            return pi
+        return None
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.ItemIsDropEnabled
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsDragEnabled
+    def supportedDropActions(self):
+        return Qt.DropAction.MoveAction
+    def set_rows(self, rows):
+        if len(rows) == len(self._rows) and all(a is b for a, b in zip(rows, self._rows)):
+            return
+        self.beginResetModel()
+        self._rows = rows
+        self._row_of = {id(pi): i for i, pi in enumerate(rows)}
+        self.endResetModel()
+    def item(self, row):
+        return self._rows[row]
+    def items(self):
+        return list(self._rows)
+    def refresh_item(self, pi):
+        row = self._row_of.get(id(pi))
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+    def move_rows(self, rows, target):
+        moving = set(rows)
+        moved = [self._rows[r] for r in rows]
+        rest = [pi for i, pi in enumerate(self._rows) if i not in moving]
+        target -= sum(1 for r in rows if r < target)
+        self.set_rows(rest[:target] + moved + rest[target:])
+
+class PlaylistView(QListView):
+    # Строки одинаковой высоты: представление не измеряет каждую строку
+    # и запрашивает у модели только видимые
     def __init__(self, parent_ctrl, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.parent_ctrl = parent_ctrl
+        self.setUniformItemSizes(True)
+        self.setDragDropMode(QAbstractItemView.InternalMove)
+        self.setDefaultDropAction(Qt.DropAction.MoveAction)
 
     def dropEvent(self, event):
-        super().dropEvent(event)
-        # После перемещения — синхронизировать self.all_items с новым порядком
-        new_order = []
-        for i in range(self.count()):
-            li = self.item(i)
-            if li is not None:
-                pi = li.data(Qt.ItemDataRole.UserRole)
-                if pi:
-                    new_order.append(pi)
-        # Сохраняем только те элементы, которые отображаются (фильтрованные)
-        rest = [pi for pi in self.parent_ctrl.all_items if pi not in new_order]
-        self.parent_ctrl.all_items = new_order + rest
-        self.parent_ctrl.save_settings()
+        model = self.model()
+        rows = sorted(index.row() for index in self.selectedIndexes())
+        if event.source() is not self or not rows:
+            event.ignore()
+            return
+        target_index = self.indexAt(event.pos())
+        target = target_index.row() if target_index.isValid() else model.rowCount()
+        if target_index.isValid() and self.dropIndicatorPosition() == QAbstractItemView.BelowItem:
+            target += 1
+        model.move_rows(rows, target)
+        # Строки уже переставлены моделью. Перетаскивание отклоняем, чтобы
+        # startDrag не получил MoveAction и не удалял исходные строки
+        # (removeRows модель и так не поддерживает)
+        event.ignore()
+        self.parent_ctrl.on_playlist_reordered(model.items())
 
 if __name__ == "__main__":
+    if getattr(sys, 'frozen', False):
+        # Собранный exe: процесс декодера запускается этим же файлом и
+        # должен уйти в decoder_process_main, а не открыть второй плеер
+        import multiprocessing
+        multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     ctrl = Controller()
     ctrl.show()